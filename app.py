@@ -1,12 +1,21 @@
 import streamlit as st
 import polars as pl
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from urllib.request import urlopen
-import glob
+import atexit
 import json
+import logging
+import math
 import os
+import time
+
+from monitor_crc import CatalogoDatos, FiltradoIncremental, Filtros, bocetos, graficos, metricas
+from monitor_crc.agregados import consultar_tabla, exportar_tabla
+from monitor_crc.figuras import CacheFiguras, huella
+from monitor_crc.ingesta import DIRECTORIO_ALMACEN
+from monitor_crc.instantanea import DIRECTORIO_INSTANTANEA
+from monitor_crc.memoria import MOTOR_STREAMING
+from monitor_crc.perfil import Perfil, activar_en_hilo, registro_perfil, rss_pico_mb
+from monitor_crc.trabajadores import PoolConsultas
+from preparar_geojson import DIRECTORIO_ASSETS, URL_GEOJSON, leer_origen, ruta_geojson, simplificar_geojson
 
 # ==========================================
 # 1. CONFIGURACIÓN DE PÁGINA Y ESTILOS CSS
@@ -17,6 +26,10 @@ st.set_page_config(
     layout="wide"
 )
 
+# Modo perfil (opt-in): MONITOR_CRC_PERFIL=1 en el servidor o ?perfil=1 en la URL
+PERFIL_ACTIVO = os.environ.get("MONITOR_CRC_PERFIL") == "1" or st.query_params.get("perfil") == "1"
+perfil = Perfil(PERFIL_ACTIVO)
+
 # CSS MEJORADO - PESTAÑAS MÁS VISIBLES
 st.markdown("""
     <style>
@@ -88,142 +101,199 @@ st.markdown("""
 # 2. CARGA DE DATOS (POLARS)
 # ==========================================
 
-@st.cache_data(ttl=3600)
-def cargar_geojson():
-    url = 'https://gist.githubusercontent.com/john-guerra/43c7656821069d00dcbc/raw/be6a6e239cd5b5b803c6e7c2ec405b793a9064dd/Colombia.geo.json'
-    with urlopen(url) as response:
-        return json.load(response)
-
-@st.cache_data(show_spinner=False)
-@st.cache_data(show_spinner=False)
-@st.cache_data(show_spinner=False)
-def cargar_datos_polars(patron_archivos):
-    archivos = glob.glob(patron_archivos)
-    
-    if not archivos:
-        return None, None
-
+@st.cache_resource(show_spinner=False)
+def leer_geojson(ruta):
+    """GeoJSON simplificado de departamentos, parseado una sola vez por proceso."""
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+@st.cache_resource(show_spinner=False)
+def descargar_geojson(tolerancia, decimales=4):
+    """Sin asset local: el GeoJSON original descargado y simplificado en memoria como en `preparar_geojson.py`."""
+    return simplificar_geojson(leer_origen(URL_GEOJSON, TIEMPO_ESPERA_GEOJSON), float(tolerancia), decimales)
+
+@st.cache_resource(show_spinner=False)
+def fallos_descarga():
+    """Momento del último intento de descarga fallido, compartido por las sesiones del proceso."""
+    return {"ultimo": None}
+
+def cargar_geojson(tolerancia):
+    """Asset local generado con `preparar_geojson.py`; si falta o está corrupto, la descarga; si no, None.
+
+    Las excepciones no se cachean: al generar el asset (o volver la red) los mapas vuelven
+    sin reiniciar el proceso. Tras una descarga fallida no se reintenta hasta pasados
+    REINTENTO_GEOJSON_S, para que un host caído no frene cada rerun.
+    """
+    ruta = ruta_geojson(DIRECTORIO_ASSETS, tolerancia)
+    if os.path.exists(ruta):
+        try:
+            return leer_geojson(ruta)
+        except (OSError, ValueError):
+            pass
+
+    fallos = fallos_descarga()
+    if fallos["ultimo"] is not None and time.monotonic() - fallos["ultimo"] < REINTENTO_GEOJSON_S:
+        return None
     try:
-        # 1. Leemos los archivos
-        df = pl.read_parquet(archivos)
-
-        # 2. Seleccionamos SOLO lo necesario y optimizamos tipos (AQUÍ ESTÁ LA MAGIA)
-        # Convertir Strings a Categorical reduce el uso de RAM hasta en un 80%
-        df = df.select([
-            pl.col('ANNO').cast(pl.Int16), # Año cabe en Int16
-            pl.col('TRIMESTRE').cast(pl.Int8),
-            pl.col('ID_DEPARTAMENTO'), # Lo necesitamos para el mapa
-            pl.col('DEPARTAMENTO').cast(pl.Categorical),
-            pl.col('MUNICIPIO').cast(pl.Categorical),
-            pl.col('EMPRESA').cast(pl.Categorical),
-            pl.col('SEGMENTO').cast(pl.Categorical),
-            pl.col('SERVICIO_PAQUETE').cast(pl.Categorical),
-            pl.col('TECNOLOGIA').cast(pl.Categorical),
-            pl.col('VELOCIDAD_EFECTIVA_DOWNSTREAM'),
-            pl.col('VELOCIDAD_EFECTIVA_UPSTREAM'),
-            pl.col('CANTIDAD_LINEAS_ACCESOS'),
-            pl.col('VALOR_FACTURADO_O_COBRADO'), 
-            pl.col('OTROS_VALORES_FACTURADOS')
-        ])
-
-        # 3. Transformaciones
-        df = df.with_columns([
-            pl.col("VALOR_FACTURADO_O_COBRADO").fill_null(0),
-            pl.col("OTROS_VALORES_FACTURADOS").fill_null(0),
-            pl.col("CANTIDAD_LINEAS_ACCESOS").fill_null(0),
-            pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").fill_null(0),
-            pl.format("{}-T{}", pl.col("ANNO"), pl.col("TRIMESTRE")).alias("PERIODO"),
-            # Convertimos a string solo al final y para la columna específica del mapa
-            pl.col("ID_DEPARTAMENTO").cast(pl.String).str.zfill(2).alias("ID_DEPTO_MAPA")
-        ])
-
-        # Calculamos Valor Total
-        df = df.with_columns(
-            (pl.col("VALOR_FACTURADO_O_COBRADO") + pl.col("OTROS_VALORES_FACTURADOS")).alias("VALOR_TOTAL")
-        )
-
-        # 4. Extraemos las opciones (Usamos casting a string temporal para obtener listas limpias)
-        opciones = {
-            'anos': df["ANNO"].unique().sort().to_list(),
-            'deptos': df["DEPARTAMENTO"].unique().cast(pl.String).sort().to_list(),
-            'empresas': df["EMPRESA"].unique().cast(pl.String).sort().to_list(),
-            'paquetes': df["SERVICIO_PAQUETE"].unique().cast(pl.String).sort().to_list(),
-            'tecnologias': df["TECNOLOGIA"].unique().cast(pl.String).sort().to_list(),
-            'max_val_facturado': df["VALOR_FACTURADO_O_COBRADO"].max(),
-            'max_otros': df["OTROS_VALORES_FACTURADOS"].max()
-        }
-
-        return df, opciones
-
-    except Exception as e:
-        st.error(f"Error Polars: {e}")
-        return None, None
+        return descargar_geojson(tolerancia)
+    except (OSError, ValueError):
+        fallos["ultimo"] = time.monotonic()
+        return None
+
+@st.cache_resource(show_spinner=False)
+def registro_agregaciones():
+    """Envía a stderr las líneas JSON del modo perfil (una por agregación), una vez por proceso.
+
+    Solo las escriben los reruns marcados con `activar_en_hilo`; el resto de las sesiones
+    ni siquiera las arma, así que el logger de perfil puede quedar en INFO.
+    """
+    manejador = logging.StreamHandler()
+    manejador.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    registro_perfil.addHandler(manejador)
+    registro_perfil.setLevel(logging.INFO)
+
+# Carga, filtros y métricas viven en el paquete monitor_crc; aquí solo se comparte
+# el catálogo entre sesiones del mismo proceso
+@st.cache_resource(show_spinner=False)
+def obtener_catalogo(patron_archivos, directorio_almacen, capacidad_cache, directorio_instantanea):
+    return CatalogoDatos(patron_archivos, directorio_almacen, capacidad_cache, directorio_instantanea)
+
+# Pool de procesos opcional para que las sesiones concurrentes no compitan por el GIL
+@st.cache_resource(show_spinner=False)
+def obtener_pool(procesos):
+    pool = PoolConsultas(procesos)
+    atexit.register(pool.cerrar)
+    return pool
+
+# Figuras ya construidas, compartidas entre sesiones: un gráfico con las mismas tablas
+# no se vuelve a armar con plotly express
+@st.cache_resource(show_spinner=False)
+def obtener_cache_figuras(capacidad_mb):
+    return CacheFiguras(capacidad_mb)
 
 # ==========================================
 # 3. INICIALIZACIÓN
 # ==========================================
 
 PATRON_ARCHIVOS = "./data_part_*.parquet" 
+CAPACIDAD_CACHE_RESULTADOS = 256  # Pares (filtros, pestaña) guardados para todas las sesiones
+PRESUPUESTOS_PUNTOS = [1000, 2500, 5000, 10000, 20000]  # Opciones del gráfico Down vs Up
+FILAS_POR_PAGINA = [25, 50, 100]  # Opciones de la tabla detallada
+TOLERANCIA_MAPA = "0.005"  # Simplificación de los polígonos (grados), ver preparar_geojson.py
+AVISO_SIN_GEOJSON = "🗺️ Mapa deshabilitado: falta el GeoJSON de departamentos y no se pudo descargar. Ejecuta `python preparar_geojson.py`."
+TIEMPO_ESPERA_GEOJSON = 10  # Segundos de la descarga de respaldo, sin asset local
+REINTENTO_GEOJSON_S = 300  # Pausa entre intentos de descarga fallidos
+CAPACIDAD_CACHE_FIGURAS_MB = 64  # Figuras guardadas para todas las sesiones, medidas por su JSON
+PROCESOS_CONSULTA = int(os.environ.get("MONITOR_CRC_PROCESOS", "0"))  # 0: métricas en el proceso del servidor
+
+catalogo = obtener_catalogo(PATRON_ARCHIVOS, DIRECTORIO_ALMACEN, CAPACIDAD_CACHE_RESULTADOS, DIRECTORIO_INSTANTANEA)
+pool = obtener_pool(PROCESOS_CONSULTA) if PROCESOS_CONSULTA > 0 else None
+cache_figuras = obtener_cache_figuras(CAPACIDAD_CACHE_FIGURAS_MB)
+
+registro_agregaciones()
+activar_en_hilo(PERFIL_ACTIVO)  # Cada rerun corre en el hilo de su sesión
 
 with st.spinner('Cargando motor de datos...'):
-    df, opciones = cargar_datos_polars(PATRON_ARCHIVOS)
-    geojson_colombia = cargar_geojson()
+    try:
+        # Solo lee los shards que no estén ya en el manifiesto
+        with perfil.medir("carga"):
+            dataset = catalogo.actualizar()
+    except Exception as e:
+        st.error(f"Error Polars: {e}")
+        dataset = catalogo.dataset
+    with perfil.medir("geojson"):
+        geojson_colombia = cargar_geojson(TOLERANCIA_MAPA)
 
-if df is None:
+if dataset is None:
     st.error(f"❌ No se encontraron archivos con el patrón: {PATRON_ARCHIVOS}")
     st.warning("Asegúrate de haber subido los archivos data_part_0.parquet, data_part_1.parquet, etc.")
     st.stop()
 
+opciones = dataset.opciones
+
 # ==========================================
 # 4. SIDEBAR - FILTROS
 # ==========================================
 
 st.sidebar.header("🔍 Filtros de Análisis")
 
+# En modo formulario los widgets no disparan reruns: los filtros se aplican todos juntos
+# con el botón, y un estado canónico repetido sale directo de la caché de resultados
+modo_formulario = st.sidebar.toggle(
+    "Aplicar con botón",
+    key="modo_formulario",
+    help="Agrupa los filtros y recalcula solo al pulsar «Aplicar filtros». Útil al mover varios filtros seguidos."
+)
+modo_aproximado = st.sidebar.toggle(
+    "≈ Modo aproximado",
+    key="modo_aproximado",
+    help="KPIs y top-N desde bocetos precalculados por periodo, departamento y empresa: "
+         "responden en tiempo constante. Los valores aproximados se marcan con ≈."
+)
+panel = st.sidebar.form("form_filtros", border=False) if modo_formulario else st.sidebar.container()
+# Con key, la identidad de cada widget no depende del formulario: cambiar de modo conserva los filtros
+
 # A. Año
-sel_ano = st.sidebar.multiselect("📅 Año", opciones['anos'], default=opciones['anos'])
+# La key incluye los años disponibles: si llega un año nuevo, la selección vuelve a "todos"
+sel_ano = panel.multiselect(
+    "📅 Año", opciones['anos'], default=opciones['anos'], key=f"sel_ano_{'_'.join(map(str, opciones['anos']))}"
+)
 
 # B. Departamento
-sel_depto = st.sidebar.multiselect("📍 Departamento", opciones['deptos'])
+sel_depto = panel.multiselect("📍 Departamento", opciones['deptos'], key="sel_depto")
 
-# C. Municipio (Filtrado dinámico)
+# C. Municipio (Filtrado dinámico desde la jerarquía precalculada, sin tocar los datos)
+jerarquia = opciones['jerarquia']
 munis_disponibles = []
+empresas_disponibles = opciones['empresas']
 if len(sel_depto) > 0:
-    subset_munis = df.filter(pl.col("DEPARTAMENTO").is_in(sel_depto))
-    munis_disponibles = subset_munis["MUNICIPIO"].unique().sort().to_list()
+    munis_disponibles = sorted(set().union(*(jerarquia[d]['municipios'] for d in sel_depto)))
+    empresas_disponibles = sorted(set().union(*(jerarquia[d]['empresas'] for d in sel_depto)))
 
-sel_muni = st.sidebar.multiselect(
+sel_muni = panel.multiselect(
     "🏙️ Municipio", 
     munis_disponibles if len(munis_disponibles) > 0 else [],
     disabled=len(sel_depto) == 0,
-    help="Seleccione primero un Departamento"
+    key="sel_muni",
+    help="Seleccione primero un Departamento" + (" y aplique" if modo_formulario else "")
 )
 
 # D. Otros Filtros
-sel_empresa = st.sidebar.multiselect("🏢 Empresa", opciones['empresas'])
-sel_paquete = st.sidebar.multiselect("📦 Paquete", opciones['paquetes'])
-sel_tecno = st.sidebar.multiselect("📡 Tecnología", opciones['tecnologias'])
+# La key conserva la selección cuando cambian las empresas disponibles
+sel_empresa = panel.multiselect(
+    "🏢 Empresa",
+    empresas_disponibles,
+    key="sel_empresa",
+    help="Con departamentos seleccionados solo se listan los operadores presentes en ellos"
+)
+sel_paquete = panel.multiselect("📦 Paquete", opciones['paquetes'], key="sel_paquete")
+sel_tecno = panel.multiselect("📡 Tecnología", opciones['tecnologias'], key="sel_tecno")
 
 # E. Sliders
-st.sidebar.markdown("---")
-st.sidebar.subheader("💰 Filtros Financieros")
+panel.markdown("---")
+panel.subheader("💰 Filtros Financieros")
 
-val_facturado_range = st.sidebar.slider(
+val_facturado_range = panel.slider(
     "Valor Facturado (COP)",
     min_value=0.0,
     max_value=float(opciones['max_val_facturado']),
     value=(0.0, float(opciones['max_val_facturado'])),
-    format="$%.0f"
+    format="$%.0f",
+    key="rango_facturado"
 )
 
-otros_valores_range = st.sidebar.slider(
+otros_valores_range = panel.slider(
     "Otros Valores (COP)",
     min_value=0.0,
     max_value=float(opciones['max_otros']),
     value=(0.0, float(opciones['max_otros'])),
-    format="$%.0f"
+    format="$%.0f",
+    key="rango_otros"
 )
 
+if modo_formulario:
+    panel.form_submit_button("✅ Aplicar filtros", type="primary", width="stretch")
+
 # NOTAS EN SIDEBAR
 st.sidebar.markdown("---")
 st.sidebar.info("ℹ️ **Nota de Datos:**\nLos datos usados son los datos que no presentaron inconvenientes de consistencia.")
@@ -233,105 +303,122 @@ st.sidebar.success("👨‍💻 **Créditos:**\nDesarrollado por **Pedro Jose Le
 # 5. APLICACIÓN DE FILTROS
 # ==========================================
 
-df_filtrado = df.filter(
-    (pl.col("VALOR_FACTURADO_O_COBRADO") >= val_facturado_range[0]) & 
-    (pl.col("VALOR_FACTURADO_O_COBRADO") <= val_facturado_range[1]) &
-    (pl.col("OTROS_VALORES_FACTURADOS") >= otros_valores_range[0]) & 
-    (pl.col("OTROS_VALORES_FACTURADOS") <= otros_valores_range[1])
+filtros = Filtros.desde_sidebar(
+    opciones, sel_ano, sel_depto, sel_muni, sel_empresa, sel_paquete, sel_tecno,
+    val_facturado_range, otros_valores_range
 )
 
-if sel_ano: df_filtrado = df_filtrado.filter(pl.col("ANNO").is_in(sel_ano))
-if sel_depto: df_filtrado = df_filtrado.filter(pl.col("DEPARTAMENTO").is_in(sel_depto))
-if sel_muni: df_filtrado = df_filtrado.filter(pl.col("MUNICIPIO").is_in(sel_muni))
-if sel_empresa: df_filtrado = df_filtrado.filter(pl.col("EMPRESA").is_in(sel_empresa))
-if sel_paquete: df_filtrado = df_filtrado.filter(pl.col("SERVICIO_PAQUETE").is_in(sel_paquete))
-if sel_tecno: df_filtrado = df_filtrado.filter(pl.col("TECNOLOGIA").is_in(sel_tecno))
+# Las métricas de cada pestaña se resuelven juntas en una sola ejecución cuando la
+# pestaña se abre, y solo si ninguna sesión ha pedido antes el mismo estado de filtros
+cache_resultados = catalogo.cache_resultados
+clave = (dataset.version, filtros.clave())
+
+# Al estrechar los filtros, la sesión re-filtra su último cubo filtrado en vez del completo
+if st.session_state.get("filtrado") is None or st.session_state["filtrado"].version != dataset.version:
+    st.session_state["filtrado"] = FiltradoIncremental(dataset)
+filtrado = st.session_state["filtrado"]
+
+def consultar(funcion, *args):
+    """Una función de `metricas` con los filtros actuales, en el pool si está activo."""
+    if pool is None:
+        return funcion(filtrado, filtros, *args)
+    return pool.ejecutar(funcion, dataset, filtros, *args)
+
+# Los contadores se llenan después del router para incluir lo que hizo la pestaña en este rerun
+contadores = st.sidebar.empty()
+if dataset.motor == MOTOR_STREAMING:
+    st.sidebar.caption(
+        f"💾 Modo streaming: ~{catalogo.estimado_mb:,.0f} MB de filas superan el techo de "
+        f"{catalogo.techo_mb:,.0f} MB (MONITOR_CRC_TECHO_MB)"
+    )
+if catalogo.sin_ingerir:
+    st.sidebar.warning(
+        f"📥 {len(catalogo.sin_ingerir)} shard(s) sin ingerir en `{DIRECTORIO_ALMACEN}` no se muestran: "
+        f"{', '.join(os.path.basename(a) for a in catalogo.sin_ingerir)}. Ejecuta `python -m monitor_crc.ingesta`."
+    )
+# Los bocetos solo se pueden filtrar por sus dimensiones (años, departamentos, empresas)
+aproximado = modo_aproximado and bocetos.aplicable(filtros)
+if modo_aproximado and not aproximado:
+    st.sidebar.caption("≈ Modo aproximado en pausa: hay filtros de municipio, paquete, tecnología o rangos financieros.")
+
+def marca_aproximado(tabla):
+    """' ≈' si la tabla de la pestaña sale aproximada de los bocetos."""
+    return " ≈" if aproximado and tabla in bocetos.TABLAS_APROXIMADAS else ""
 
 # ==========================================
 # 6. PESTAÑAS Y GRÁFICOS
 # ==========================================
 
-tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-    "📊 GENERAL", 
-    "💰 FINANCIERO", 
-    "📈 TENDENCIAS", 
-    "📶 CONECTIVIDAD", 
-    "🏆 COMPETENCIA",
-    "🎯 SEGMENTACIÓN",
-    "📍 GEOGRÁFICO"
-])
+# Cada pestaña es una función que recibe sus agregados; el enrutador del final
+# solo ejecuta la que está abierta. Los DataFrames de Polars van directo a Plotly
+# (vía narwhals) y a st.dataframe (vía Arrow), sin materializarse en pandas.
+
+pestana_actual = None  # La fija el enrutador; nombra las secciones del perfil
+
+def mostrar_grafico(nombre, construir, *tablas, **opciones):
+    """st.plotly_chart de la figura `construir(*tablas, **opciones)` (ver monitor_crc.graficos).
+
+    La figura sale de la caché compartida si ya se construyó con tablas de igual
+    contenido (las opciones, como el GeoJSON, son fijas por proceso); el perfil mide
+    construcción (o acierto) y serialización juntas.
+    """
+    with perfil.medir(f"{pestana_actual}/{nombre}"):
+        fig = cache_figuras.obtener((nombre, huella(*tablas)), lambda: construir(*tablas, **opciones))
+        st.plotly_chart(fig, width="stretch")
 
 # --------------------------------------------------------
 # PESTAÑA 1: ANÁLISIS GENERAL
 # --------------------------------------------------------
-with tab1:
+def pestana_general(res):
     st.markdown("### 🗺️ Panorama General de Registros")
+    kpis = res["kpis"].row(0, named=True)
     
     k1, k2, k3, k4, k5 = st.columns(5)
-    k1.metric("Total Registros", f"{df_filtrado.height:,}")
-    k2.metric("Departamentos", df_filtrado["DEPARTAMENTO"].n_unique())
-    k3.metric("Municipios", df_filtrado["MUNICIPIO"].n_unique())
-    k4.metric("Vel. Bajada Prom.", f"{df_filtrado['VELOCIDAD_EFECTIVA_DOWNSTREAM'].mean():.1f} Mbps")
-    k5.metric("Empresas", df_filtrado["EMPRESA"].n_unique())
+    k1.metric("Total Registros", f"{kpis['REGISTROS']:,}")
+    k2.metric("Departamentos", kpis["DEPARTAMENTO"])
+    k3.metric("Municipios" + marca_aproximado("kpis"), kpis["MUNICIPIO"])
+    k4.metric("Vel. Bajada Prom.", f"{kpis['VELOCIDAD_EFECTIVA_DOWNSTREAM']:.1f} Mbps")
+    k5.metric("Empresas", kpis["EMPRESA"])
 
     row1_c1, row1_c2 = st.columns([3, 2])
     
     with row1_c1:
         st.info("🗺️ Distribución Geográfica de Registros")
-        map_data = df_filtrado.group_by(["ID_DEPTO_MAPA", "DEPARTAMENTO"]).len().to_pandas()
-        if not map_data.empty:
-            fig_map = px.choropleth(
-                map_data, geojson=geojson_colombia, locations='ID_DEPTO_MAPA',
-                featureidkey='properties.DPTO', color='len', 
-                color_continuous_scale="Viridis",
-                hover_name="DEPARTAMENTO",
-                labels={'len': 'Registros'}
-            )
-            fig_map.update_geos(fitbounds="locations", visible=False)
-            fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, height=450)
-            st.plotly_chart(fig_map, use_container_width=True)
+        map_data = res["map_data"]
+        if geojson_colombia is None:
+            st.warning(AVISO_SIN_GEOJSON)
+        elif not map_data.is_empty():
+            mostrar_grafico("map", graficos.mapa_registros, map_data, geojson=geojson_colombia)
         else:
             st.warning("Sin datos para el mapa")
 
     with row1_c2:
-        st.info("🏅 Top 10 Municipios")
-        muni_data = df_filtrado.group_by("MUNICIPIO").len().sort("len", descending=True).head(10).to_pandas().sort_values("len", ascending=True)
-        fig_muni = px.bar(muni_data, x='len', y='MUNICIPIO', orientation='h', 
-                          color='len', color_continuous_scale='Teal',
-                          labels={'len': 'Registros'})
-        fig_muni.update_layout(showlegend=False)
-        st.plotly_chart(fig_muni, use_container_width=True)
+        st.info("🏅 Top 10 Municipios" + marca_aproximado("muni_data"))
+        muni_data = res["muni_data"]
+        mostrar_grafico("muni", graficos.top_municipios, muni_data)
 
     row2_c1, row2_c2 = st.columns([1, 2])
 
     with row2_c1:
         st.info("📦 Mix de Servicios")
-        serv_data = df_filtrado.group_by("SERVICIO_PAQUETE").len().to_pandas()
-        fig_donut = px.pie(serv_data, values='len', names='SERVICIO_PAQUETE', hole=0.5)
-        fig_donut.update_layout(
-            height=400, 
-            margin=dict(t=20, b=20, l=10, r=10),
-            legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5)
-        )
-        st.plotly_chart(fig_donut, use_container_width=True)
+        serv_data = res["serv_data"]
+        mostrar_grafico("donut", graficos.mix_servicios, serv_data)
 
     with row2_c2:
         st.info("👥 Registros por Segmento")
-        seg_data = df_filtrado.group_by("SEGMENTO").len().sort("len").to_pandas()
-        fig_seg = px.bar(seg_data, x='len', y='SEGMENTO', orientation='h', 
-                        text_auto='.2s', color='len', color_continuous_scale='Blues')
-        fig_seg.update_layout(showlegend=False)
-        st.plotly_chart(fig_seg, use_container_width=True)
+        seg_data = res["seg_data"]
+        mostrar_grafico("seg", graficos.registros_segmento, seg_data)
 
 # --------------------------------------------------------
 # PESTAÑA 2: ANÁLISIS FINANCIERO
 # --------------------------------------------------------
-with tab2:
+def pestana_financiero(res):
     st.markdown("### 💰 Comportamiento de Facturación")
+    kpis = res["kpis"].row(0, named=True)
     
-    total_facturado = df_filtrado["VALOR_FACTURADO_O_COBRADO"].sum()
-    total_otros = df_filtrado["OTROS_VALORES_FACTURADOS"].sum()
-    total_general = df_filtrado["VALOR_TOTAL"].sum()
+    total_facturado = kpis["VALOR_FACTURADO_O_COBRADO"]
+    total_otros = kpis["OTROS_VALORES_FACTURADOS"]
+    total_general = kpis["VALOR_TOTAL"]
     
     k1, k2, k3 = st.columns(3)
     k1.metric("💵 Valor Facturado", f"${total_facturado/1e9:,.2f}B")
@@ -342,117 +429,68 @@ with tab2:
 
     with c1:
         st.info("📊 Composición de Ingresos")
-        comp_data = pl.DataFrame({
-            "Tipo": ["Valor Facturado", "Otros Valores"],
-            "Monto": [total_facturado, total_otros]
-        }).to_pandas()
-        fig_comp = px.pie(comp_data, values='Monto', names='Tipo', hole=0.4,
-                          color_discrete_sequence=['#1f77b4', '#ff7f0e'])
-        st.plotly_chart(fig_comp, use_container_width=True)
+        mostrar_grafico("comp", graficos.composicion_ingresos, res["kpis"])
 
     with c2:
         st.info("🎯 Valor Total por Paquete")
-        val_paq = df_filtrado.group_by("SERVICIO_PAQUETE").agg(pl.col("VALOR_TOTAL").sum()).to_pandas()
-        fig_tree = px.treemap(
-            val_paq, 
-            path=['SERVICIO_PAQUETE'], 
-            values='VALOR_TOTAL',
-            color='VALOR_TOTAL',
-            color_continuous_scale='Greens'
-        )
-        fig_tree.update_traces(textinfo="label+value")
-        st.plotly_chart(fig_tree, use_container_width=True)
+        val_paq = res["val_paq"]
+        mostrar_grafico("tree", graficos.valor_paquete, val_paq)
 
     c3, c4 = st.columns(2)
 
     with c3:
         st.info("🏢 Top 10 Operadores - Total")
-        val_op = df_filtrado.group_by("EMPRESA").agg(pl.col("VALOR_TOTAL").sum()).sort("VALOR_TOTAL", descending=True).head(10).to_pandas()
-        fig_op_val = px.bar(
-            val_op, 
-            x='EMPRESA', 
-            y='VALOR_TOTAL', 
-            color='VALOR_TOTAL', 
-            color_continuous_scale='YlGnBu',
-            text_auto='.2s'
-        )
-        fig_op_val.update_layout(yaxis_title="Total (COP)", xaxis_title=None, showlegend=False)
-        st.plotly_chart(fig_op_val, use_container_width=True)
+        val_op = res["val_op"]
+        mostrar_grafico("op_val", graficos.valor_operador, val_op)
 
     with c4:
         st.info("📡 Ingresos por Tecnología")
-        val_tec = df_filtrado.group_by("TECNOLOGIA").agg(pl.col("VALOR_TOTAL").sum()).sort("VALOR_TOTAL", descending=True).to_pandas()
-        fig_tec = px.bar(val_tec, x='TECNOLOGIA', y='VALOR_TOTAL', 
-                        color='VALOR_TOTAL', color_continuous_scale='Reds',
-                        text_auto='.2s')
-        fig_tec.update_layout(showlegend=False)
-        st.plotly_chart(fig_tec, use_container_width=True)
+        val_tec = res["val_tec"]
+        mostrar_grafico("tec", graficos.ingresos_tecnologia, val_tec)
 
 # --------------------------------------------------------
 # PESTAÑA 3: TENDENCIAS
 # --------------------------------------------------------
-with tab3:
+def pestana_tendencias(res):
     st.markdown("### 📈 Evolución Temporal del Mercado")
 
-    df_temp = df_filtrado.group_by("PERIODO").agg([
-        pl.len().alias("REGISTROS"),
-        pl.col("VALOR_TOTAL").sum(),
-        pl.col("CANTIDAD_LINEAS_ACCESOS").sum()
-    ]).sort("PERIODO").to_pandas()
-
-    fig_main_trend = make_subplots(specs=[[{"secondary_y": True}]])
-    fig_main_trend.add_trace(
-        go.Scatter(x=df_temp['PERIODO'], y=df_temp['VALOR_TOTAL'], 
-                  name="Facturación ($)", line=dict(color='green', width=3)), 
-        secondary_y=False
-    )
-    fig_main_trend.add_trace(
-        go.Bar(x=df_temp['PERIODO'], y=df_temp['REGISTROS'], 
-              name="Registros", opacity=0.3, marker_color='lightblue'), 
-        secondary_y=True
-    )
-    fig_main_trend.update_layout(title="Evolución: Facturación vs Volumen", height=450)
-    st.plotly_chart(fig_main_trend, use_container_width=True)
+    df_temp = res["df_temp"]
+
+    mostrar_grafico("main_trend", graficos.tendencia_principal, df_temp)
 
     c1, c2 = st.columns(2)
 
     with c1:
         st.caption("📡 Evolución Tecnologías (% Market Share)")
-        tec_trend = df_filtrado.group_by(["PERIODO", "TECNOLOGIA"]).len().sort("PERIODO").to_pandas()
-        fig_area_tec = px.area(tec_trend, x="PERIODO", y="len", color="TECNOLOGIA", groupnorm='percent')
-        st.plotly_chart(fig_area_tec, use_container_width=True)
+        tec_trend = res["tec_trend"]
+        mostrar_grafico("area_tec", graficos.tendencia_tecnologias, tec_trend)
 
     with c2:
         st.caption("📦 Popularidad de Paquetes")
-        paq_trend = df_filtrado.group_by(["PERIODO", "SERVICIO_PAQUETE"]).len().sort("PERIODO").to_pandas()
-        fig_line_paq = px.line(paq_trend, x="PERIODO", y="len", color="SERVICIO_PAQUETE", markers=True)
-        st.plotly_chart(fig_line_paq, use_container_width=True)
+        paq_trend = res["paq_trend"]
+        mostrar_grafico("line_paq", graficos.popularidad_paquetes, paq_trend)
 
     c3, c4 = st.columns(2)
 
     with c3:
         st.caption("⚡ Velocidad Bajada Promedio")
-        vel_trend = df_filtrado.group_by("PERIODO").agg(pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").mean()).sort("PERIODO").to_pandas()
-        fig_vel = px.line(vel_trend, x="PERIODO", y="VELOCIDAD_EFECTIVA_DOWNSTREAM", 
-                         markers=True, line_shape='spline')
-        st.plotly_chart(fig_vel, use_container_width=True)
+        vel_trend = res["vel_trend"]
+        mostrar_grafico("vel", graficos.velocidad_periodo, vel_trend)
 
     with c4:
         st.caption("🔥 Intensidad Top 5 Operadores")
-        top5_ops = df_filtrado.group_by("EMPRESA").len().sort("len", descending=True).head(5)["EMPRESA"].to_list()
-        heat_data = df_filtrado.filter(pl.col("EMPRESA").is_in(top5_ops)).group_by(["PERIODO", "EMPRESA"]).len().sort("PERIODO").to_pandas()
-        fig_heat = px.density_heatmap(heat_data, x="PERIODO", y="EMPRESA", z="len", 
-                                      color_continuous_scale="YlOrRd")
-        st.plotly_chart(fig_heat, use_container_width=True)
+        heat_data = res["heat_data"]
+        mostrar_grafico("heat", graficos.intensidad_operadores, heat_data)
 
 # --------------------------------------------------------
 # PESTAÑA 4: CONECTIVIDAD
 # --------------------------------------------------------
-with tab4:
+def pestana_conectividad(res):
     st.markdown("### 📶 Detalles de Conectividad")
-    total_lineas = df_filtrado["CANTIDAD_LINEAS_ACCESOS"].sum()
-    vel_down_prom = df_filtrado["VELOCIDAD_EFECTIVA_DOWNSTREAM"].mean()
-    vel_up_prom = df_filtrado["VELOCIDAD_EFECTIVA_UPSTREAM"].mean()
+    kpis = res["kpis"].row(0, named=True)
+    total_lineas = kpis["CANTIDAD_LINEAS_ACCESOS"]
+    vel_down_prom = kpis["VELOCIDAD_EFECTIVA_DOWNSTREAM"]
+    vel_up_prom = kpis["VELOCIDAD_EFECTIVA_UPSTREAM"]
     
     k1, k2, k3 = st.columns(3)
     k1.metric("📱 Total Líneas/Accesos", f"{total_lineas:,.0f}")
@@ -462,205 +500,226 @@ with tab4:
     c1, c2 = st.columns(2)
     with c1:
         st.caption("📡 Líneas por Tecnología")
-        lin_tec = df_filtrado.group_by("TECNOLOGIA").agg(pl.col("CANTIDAD_LINEAS_ACCESOS").sum()).to_pandas()
-        fig_lin_tec = px.pie(lin_tec, values="CANTIDAD_LINEAS_ACCESOS", names="TECNOLOGIA", hole=0.4)
-        st.plotly_chart(fig_lin_tec, use_container_width=True)
+        lin_tec = res["lin_tec"]
+        mostrar_grafico("lin_tec", graficos.lineas_tecnologia, lin_tec)
 
     with c2:
         st.caption("👥 Líneas por Segmento")
-        lin_seg = df_filtrado.group_by("SEGMENTO").agg(pl.col("CANTIDAD_LINEAS_ACCESOS").sum()).sort("CANTIDAD_LINEAS_ACCESOS", descending=True).to_pandas()
-        fig_lin_seg = px.bar(lin_seg, x="SEGMENTO", y="CANTIDAD_LINEAS_ACCESOS", 
-                            color="CANTIDAD_LINEAS_ACCESOS", text_auto='.2s',
-                            color_continuous_scale='Purples')
-        fig_lin_seg.update_layout(showlegend=False)
-        st.plotly_chart(fig_lin_seg, use_container_width=True)
+        lin_seg = res["lin_seg"]
+        mostrar_grafico("lin_seg", graficos.lineas_segmento, lin_seg)
 
     c3, c4 = st.columns(2)
     with c3:
         st.caption("🏆 Top 10 Deptos - Mejor Velocidad")
-        vel_depto = df_filtrado.group_by("DEPARTAMENTO").agg(pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").mean()).sort("VELOCIDAD_EFECTIVA_DOWNSTREAM", descending=True).head(10).to_pandas()
-        fig_vel_dep = px.bar(vel_depto, x="VELOCIDAD_EFECTIVA_DOWNSTREAM", y="DEPARTAMENTO", 
-                            orientation='h', color='VELOCIDAD_EFECTIVA_DOWNSTREAM',
-                            color_continuous_scale='Teal')
-        fig_vel_dep.update_layout(showlegend=False)
-        st.plotly_chart(fig_vel_dep, use_container_width=True)
+        vel_depto = res["vel_depto"]
+        mostrar_grafico("vel_dep", graficos.velocidad_departamento, vel_depto)
 
     with c4:
         st.caption("⚖️ Simetría Down vs Up")
-        df_sample_vel = df_filtrado.sample(n=min(1000, df_filtrado.height), seed=1).to_pandas()
-        fig_scat_vel = px.scatter(df_sample_vel, x="VELOCIDAD_EFECTIVA_DOWNSTREAM", 
-                                  y="VELOCIDAD_EFECTIVA_UPSTREAM", color="TECNOLOGIA",
-                                  opacity=0.6)
-        st.plotly_chart(fig_scat_vel, use_container_width=True)
+        modo_vel = st.radio(
+            "Vista", ["Densidad (todas las filas)", "Muestra por tecnología"],
+            horizontal=True, label_visibility="collapsed", key="modo_vel"
+        )
+        presupuesto = st.select_slider(
+            "Puntos enviados al navegador", PRESUPUESTOS_PUNTOS,
+            value=PRESUPUESTOS_PUNTOS[2], key="presupuesto_vel"
+        )
+
+        # Se calcula sobre las filas crudas y se guarda en la caché compartida junto al
+        # estado de filtros, para no repetirlo mientras no cambie la vista
+        if modo_vel == "Densidad (todas las filas)":
+            bins = int(presupuesto ** 0.5)
+            with perfil.medir("conectividad/densidad_down_up"):
+                hist = cache_resultados.obtener(
+                    clave + ("densidad", bins),
+                    lambda: consultar(metricas.densidad_velocidades, bins)
+                )
+
+            mostrar_grafico("scat_vel_densidad", graficos.densidad_velocidades, hist, bins)
+        else:
+            with perfil.medir("conectividad/muestra_down_up"):
+                df_sample_vel = cache_resultados.obtener(
+                    clave + ("muestra", presupuesto),
+                    lambda: consultar(metricas.muestra_velocidades, presupuesto)
+                )
+            mostrar_grafico("scat_vel_muestra", graficos.muestra_velocidades, df_sample_vel)
+
+    # Percentiles y CDF desde histogramas log precalculados: los promedios de arriba se
+    # inflan con unos pocos planes muy rápidos
+    st.markdown("#### 📊 Distribución de Velocidades")
+    sentido = st.radio("Sentido", ["BAJADA", "SUBIDA"], horizontal=True, key="sentido_dist")
+    with perfil.medir("conectividad/distribucion"):
+        dist = cache_resultados.obtener(
+            clave + ("distribucion",), lambda: consultar(metricas.distribucion_velocidades)
+        )
+
+    d1, d2 = st.columns(2)
+    with d1:
+        st.caption("📈 Mediana y banda p10–p90 por periodo")
+        por_periodo = dist["por_periodo"].filter(pl.col("SENTIDO") == sentido)
+        mostrar_grafico("percentiles", graficos.percentiles_periodo, por_periodo)
+    with d2:
+        st.caption("📶 Distribución acumulada por tecnología")
+        cdf_tec = dist["cdf_tecnologia"].filter(pl.col("SENTIDO") == sentido)
+        mostrar_grafico("cdf", graficos.cdf_tecnologia, cdf_tec)
+
+    st.dataframe(
+        dist["por_tecnologia"].filter(pl.col("SENTIDO") == sentido).drop("SENTIDO"),
+        width="stretch",
+        hide_index=True,
+        column_config={
+            "P10": st.column_config.NumberColumn("p10 (Mbps)", format="%.1f"),
+            "P50": st.column_config.NumberColumn("Mediana (Mbps)", format="%.1f"),
+            "P90": st.column_config.NumberColumn("p90 (Mbps)", format="%.1f"),
+            "REGISTROS": st.column_config.NumberColumn("Registros", format="%d")
+        }
+    )
 
 # --------------------------------------------------------
 # PESTAÑA 5: COMPETENCIA
 # --------------------------------------------------------
-with tab5:
+def pestana_competencia(res):
     st.markdown("### 🏆 Competencia y Mercado")
 
     c1, c2 = st.columns(2)
     with c1:
         st.caption("💰 Market Share (Ingresos)")
-        share_val = df_filtrado.group_by("EMPRESA").agg(pl.col("VALOR_TOTAL").sum()).sort("VALOR_TOTAL", descending=True).head(8).to_pandas()
-        fig_share1 = px.pie(share_val, values="VALOR_TOTAL", names="EMPRESA", hole=0.5)
-        st.plotly_chart(fig_share1, use_container_width=True)
+        share_val = res["share_val"]
+        mostrar_grafico("share1", graficos.share_ingresos, share_val)
 
     with c2:
         st.caption("📊 Market Share (Volumen)")
-        share_vol = df_filtrado.group_by("EMPRESA").len().sort("len", descending=True).head(8).to_pandas()
-        fig_share2 = px.pie(share_vol, values="len", names="EMPRESA", hole=0.5)
-        st.plotly_chart(fig_share2, use_container_width=True)
+        share_vol = res["share_vol"]
+        mostrar_grafico("share2", graficos.share_volumen, share_vol)
 
     st.caption("👑 Operador Líder por Departamento")
-    dom_op = (
-        df_filtrado
-        .group_by(["DEPARTAMENTO", "EMPRESA"])
-        .len()
-        .sort("len", descending=True)
-        .group_by("DEPARTAMENTO")
-        .first()
-        .to_pandas()
-    )
-    fig_dom = px.bar(dom_op, x="DEPARTAMENTO", y="len", color="EMPRESA",
-                    text='EMPRESA')
-    fig_dom.update_layout(xaxis_tickangle=-45)
-    st.plotly_chart(fig_dom, use_container_width=True)
+    dom_op = res["dom_op"]
+    mostrar_grafico("dom", graficos.operador_lider, dom_op)
 
     st.caption("🔧 Mix Tecnológico - Top Jugadores")
-    top10_ops_list = share_vol["EMPRESA"].to_list()
-    div_op = df_filtrado.filter(pl.col("EMPRESA").is_in(top10_ops_list)).group_by(["EMPRESA", "TECNOLOGIA"]).len().to_pandas()
-    fig_div = px.bar(div_op, x="EMPRESA", y="len", color="TECNOLOGIA", text_auto=True)
-    fig_div.update_layout(xaxis_tickangle=-45)
-    st.plotly_chart(fig_div, use_container_width=True)
+    div_op = res["div_op"]
+    mostrar_grafico("div", graficos.mix_operadores, div_op)
 
 # --------------------------------------------------------
 # PESTAÑA 6: SEGMENTACIÓN
 # --------------------------------------------------------
-with tab6:
+def pestana_segmentacion(res):
     st.markdown("### 🎯 Análisis por Segmento y Estrato")
     
     c1, c2 = st.columns(2)
     
     with c1:
         st.info("📊 Distribución de Registros por Segmento")
-        seg_dist = df_filtrado.group_by("SEGMENTO").len().sort("len", descending=True).to_pandas()
-        fig_seg_dist = px.bar(seg_dist, x='SEGMENTO', y='len', 
-                             color='len', color_continuous_scale='Blues',
-                             text_auto='.2s')
-        fig_seg_dist.update_layout(showlegend=False, xaxis_tickangle=-45)
-        st.plotly_chart(fig_seg_dist, use_container_width=True)
+        seg_dist = res["seg_dist"]
+        mostrar_grafico("seg_dist", graficos.distribucion_segmento, seg_dist)
     
     with c2:
         st.info("💰 Ingresos por Segmento")
-        seg_val = df_filtrado.group_by("SEGMENTO").agg(pl.col("VALOR_TOTAL").sum()).sort("VALOR_TOTAL", descending=True).to_pandas()
-        fig_seg_val = px.pie(seg_val, values='VALOR_TOTAL', names='SEGMENTO')
-        st.plotly_chart(fig_seg_val, use_container_width=True)
+        seg_val = res["seg_val"]
+        mostrar_grafico("seg_val", graficos.ingresos_segmento, seg_val)
     
     c3, c4 = st.columns(2)
     
     with c3:
         st.info("📡 Tecnología Preferida por Segmento")
-        seg_tec = df_filtrado.group_by(["SEGMENTO", "TECNOLOGIA"]).len().to_pandas()
-        fig_seg_tec = px.sunburst(
-            seg_tec, 
-            path=['SEGMENTO', 'TECNOLOGIA'], 
-            values='len',
-            color='len',
-            color_continuous_scale='RdBu'
-        )
-        st.plotly_chart(fig_seg_tec, use_container_width=True)
+        seg_tec = res["seg_tec"]
+        mostrar_grafico("seg_tec", graficos.tecnologia_segmento, seg_tec)
 
     with c4:
         st.info("⚡ Velocidad Promedio (Mbps) por Segmento")
-        seg_vel = df_filtrado.group_by("SEGMENTO").agg(
-            pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").mean()
-        ).sort("VELOCIDAD_EFECTIVA_DOWNSTREAM", descending=True).to_pandas()
+        seg_vel = res["seg_vel"]
         
-        fig_seg_vel = px.bar(
-            seg_vel, 
-            x='SEGMENTO', 
-            y='VELOCIDAD_EFECTIVA_DOWNSTREAM',
-            color='VELOCIDAD_EFECTIVA_DOWNSTREAM',
-            color_continuous_scale='Viridis',
-            text_auto='.1f'
-        )
-        fig_seg_vel.update_layout(yaxis_title="Mbps", showlegend=False)
-        st.plotly_chart(fig_seg_vel, use_container_width=True)
+        mostrar_grafico("seg_vel", graficos.velocidad_segmento, seg_vel)
 
 # --------------------------------------------------------
 # PESTAÑA 7: GEOGRÁFICO
 # --------------------------------------------------------
-with tab7:
+def pestana_geografico(res):
     st.markdown("### 📍 Análisis Geográfico Detallado")
 
     col_geo1, col_geo2 = st.columns([2, 1])
 
     with col_geo1:
         st.markdown("#### 🗺️ Mapa de Calor: Ingresos por Departamento")
-        map_rev_data = df_filtrado.group_by(["ID_DEPTO_MAPA", "DEPARTAMENTO"]).agg(
-            pl.col("VALOR_TOTAL").sum()
-        ).to_pandas()
-
-        if not map_rev_data.empty:
-            fig_map_rev = px.choropleth(
-                map_rev_data,
-                geojson=geojson_colombia,
-                locations='ID_DEPTO_MAPA',
-                featureidkey='properties.DPTO',
-                color='VALOR_TOTAL',
-                color_continuous_scale="Inferno",
-                hover_name="DEPARTAMENTO",
-                title="Ingresos Totales (COP)",
-                labels={'VALOR_TOTAL': 'Ingresos'}
-            )
-            fig_map_rev.update_geos(fitbounds="locations", visible=False)
-            fig_map_rev.update_layout(
-                margin={"r":0,"t":30,"l":0,"b":0}, 
-                height=500,
-                coloraxis_colorbar=dict(title="COP")
-            )
-            st.plotly_chart(fig_map_rev, use_container_width=True)
+        map_rev_data = res["map_rev_data"]
+
+        if geojson_colombia is None:
+            st.warning(AVISO_SIN_GEOJSON)
+        elif not map_rev_data.is_empty():
+            mostrar_grafico("map_rev", graficos.mapa_ingresos, map_rev_data, geojson=geojson_colombia)
         else:
             st.warning("No hay datos suficientes para generar el mapa de ingresos.")
 
     with col_geo2:
-        st.markdown("#### 🏆 Top 10 Municipios por Ingresos")
-        top_munis = df_filtrado.group_by("MUNICIPIO").agg(
-            pl.col("VALOR_TOTAL").sum()
-        ).sort("VALOR_TOTAL", descending=True).head(10).to_pandas()
+        st.markdown("#### 🏆 Top 10 Municipios por Ingresos" + marca_aproximado("top_munis"))
+        top_munis = res["top_munis"]
 
+        # Barra de progreso en vez de background_gradient: se pinta en el navegador
+        # sin pasar por pandas Styler ni matplotlib
         st.dataframe(
-            top_munis.style.format({"VALOR_TOTAL": "${:,.0f}"}).background_gradient(cmap="Greens"),
-            use_container_width=True,
-            hide_index=True
+            top_munis,
+            width="stretch",
+            hide_index=True,
+            column_order=["MUNICIPIO", "VALOR_TOTAL"],
+            column_config={
+                "VALOR_TOTAL": st.column_config.ProgressColumn(
+                    format="$%.0f", min_value=0, max_value=float(top_munis["VALOR_TOTAL"].max() or 0)
+                )
+            }
         )
 
+        if "COTA_ERROR" in top_munis.columns and not top_munis.is_empty() and top_munis["COTA_ERROR"][0] > 0:
+            st.caption(f"≈ Cada valor puede quedar corto hasta en ${top_munis['COTA_ERROR'][0]:,.0f}.")
+
         st.markdown("#### 📉 Municipios con Menor Conectividad")
-        low_speed_munis = df_filtrado.group_by("MUNICIPIO").agg(
-            pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").mean()
-        ).sort("VELOCIDAD_EFECTIVA_DOWNSTREAM").head(10).to_pandas()
+        low_speed_munis = res["low_speed_munis"]
 
         st.dataframe(
-            low_speed_munis.style.format({"VELOCIDAD_EFECTIVA_DOWNSTREAM": "{:.2f} Mbps"}),
-            use_container_width=True,
-            hide_index=True
+            low_speed_munis,
+            width="stretch",
+            hide_index=True,
+            column_config={
+                "VELOCIDAD_EFECTIVA_DOWNSTREAM": st.column_config.NumberColumn(format="%.2f Mbps")
+            }
         )
 
     st.markdown("---")
     st.markdown("### 📋 Tabla de Datos Agregada")
     
     with st.expander("Ver Tabla Detallada por Departamento y Municipio"):
-        tabla_resumen = df_filtrado.group_by(["DEPARTAMENTO", "MUNICIPIO"]).agg([
-            pl.len().alias("TOTAL_REGISTROS"),
-            pl.col("VALOR_TOTAL").sum().alias("TOTAL_INGRESOS"),
-            pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").mean().alias("VEL_BAJADA_PROM"),
-            pl.col("CANTIDAD_LINEAS_ACCESOS").sum().alias("TOTAL_ACCESOS")
-        ]).sort("TOTAL_INGRESOS", descending=True).to_pandas()
+        tabla_resumen = res["tabla_resumen"]
+
+        # Búsqueda, orden y paginado se resuelven en Polars: al navegador solo viaja la página
+        def primera_pagina():
+            """Una búsqueda u orden nuevo empieza en la primera página de sus resultados."""
+            st.session_state["pagina_tabla"] = 1
+
+        b1, b2, b3, b4 = st.columns([3, 2, 1, 1])
+        busqueda = b1.text_input(
+            "🔎 Buscar departamento o municipio", key="busqueda_tabla", on_change=primera_pagina
+        )
+        orden = b2.selectbox(
+            "Ordenar por", tabla_resumen.columns,
+            index=tabla_resumen.columns.index("TOTAL_INGRESOS"), key="orden_tabla", on_change=primera_pagina
+        )
+        descendente = b3.toggle("Descendente", value=True, key="descendente_tabla", on_change=primera_pagina)
+        filas_por_pagina = b4.selectbox("Filas", FILAS_POR_PAGINA, key="filas_tabla")
+
+        consulta = consultar_tabla(tabla_resumen, busqueda, orden, descendente)
+        total_filas = consulta.select(pl.len()).collect().item()
+        total_paginas = max(1, math.ceil(total_filas / filas_por_pagina))
+        pagina = min(
+            st.number_input(f"Página (de {total_paginas})", min_value=1, step=1, key="pagina_tabla"),
+            total_paginas
+        )
+        inicio = (pagina - 1) * filas_por_pagina
+        filas_pagina = consulta.slice(inicio, filas_por_pagina).collect()
+        st.caption(f"Filas {min(inicio + 1, total_filas):,}–{inicio + filas_pagina.height:,} de {total_filas:,}")
 
         st.dataframe(
-            tabla_resumen,
-            use_container_width=True,
+            filas_pagina,
+            width="stretch",
+            hide_index=True,
             column_config={
                 "TOTAL_INGRESOS": st.column_config.NumberColumn(format="$%.0f"),
                 "VEL_BAJADA_PROM": st.column_config.NumberColumn(format="%.2f Mbps"),
@@ -668,6 +727,62 @@ with tab7:
             }
         )
 
+        # La exportación (toda la consulta, no solo la página) se genera al hacer clic
+        e1, e2 = st.columns(2)
+        e1.download_button(
+            "⬇️ Exportar CSV", lambda: exportar_tabla(consulta, "csv"),
+            file_name="resumen_departamento_municipio.csv", mime="text/csv", on_click="ignore"
+        )
+        e2.download_button(
+            "⬇️ Exportar Parquet", lambda: exportar_tabla(consulta, "parquet"),
+            file_name="resumen_departamento_municipio.parquet", mime="application/octet-stream",
+            on_click="ignore"
+        )
+
+# --------------------------------------------------------
+# ENRUTADOR DE PESTAÑAS
+# --------------------------------------------------------
+PESTANAS = [
+    ("📊 GENERAL", "general", pestana_general),
+    ("💰 FINANCIERO", "financiero", pestana_financiero),
+    ("📈 TENDENCIAS", "tendencias", pestana_tendencias),
+    ("📶 CONECTIVIDAD", "conectividad", pestana_conectividad),
+    ("🏆 COMPETENCIA", "competencia", pestana_competencia),
+    ("🎯 SEGMENTACIÓN", "segmentacion", pestana_segmentacion),
+    ("📍 GEOGRÁFICO", "geografico", pestana_geografico)
+]
+
+# Con on_change="rerun" Streamlit informa qué pestaña está abierta y las demás quedan
+# vacías: sus agregados y figuras no se calculan en este rerun. Lo ya calculado para
+# otras pestañas sigue en la caché, así que volver a ellas no repite el trabajo.
+contenedores = st.tabs([etiqueta for etiqueta, _, _ in PESTANAS], key="pestana", on_change="rerun")
+for (etiqueta, pestana, dibujar), contenedor in zip(PESTANAS, contenedores):
+    if not contenedor.open:
+        continue
+    pestana_actual = pestana
+    with contenedor, perfil.medir(f"pestaña {pestana}"):
+        with perfil.medir(f"{pestana}/métricas"):
+            res = cache_resultados.obtener(
+                clave + (pestana, aproximado), lambda: consultar(metricas.PESTANAS[pestana], aproximado)
+            )
+        dibujar(res)
+
+with contadores.container():
+    st.caption(
+        f"⚡ Caché de resultados: {cache_resultados.aciertos} aciertos · "
+        f"{cache_resultados.fallos} fallos · "
+        f"{len(cache_resultados.entradas)}/{cache_resultados.capacidad} entradas"
+    )
+    st.caption(
+        f"🖼️ Caché de figuras: {cache_figuras.aciertos} aciertos · {cache_figuras.fallos} fallos · "
+        f"{len(cache_figuras.entradas)} figuras · "
+        f"{cache_figuras.memoria_mb:.1f}/{CAPACIDAD_CACHE_FIGURAS_MB} MB"
+    )
+    if pool is None:
+        st.caption(
+            f"🔎 Esta sesión: {filtrado.refinados} filtros refinados · {filtrado.completos} desde el cubo completo"
+        )
+
 # ==========================================
 # FOOTER / NOTAS FINALES
 # ==========================================
@@ -679,3 +794,42 @@ st.markdown("""
 </div>
 
 """, unsafe_allow_html=True)
+
+# ==========================================
+# PERFIL DEL RERUN (solo en modo perfil)
+# ==========================================
+if PERFIL_ACTIVO:
+    # Materializar el cubo filtrado cuesta una consulta más: solo se paga en modo perfil y
+    # sin pool (con el pool, el cubo filtrado vive en los procesos y no se repite aquí)
+    cubo_filtrado = None
+    if pool is None:
+        with perfil.medir("perfil/cubo_filtrado"):
+            cubo_filtrado = filtrado.filtrar(filtros).collect(engine=filtrado.motor)
+    rss = rss_pico_mb()
+
+    with st.sidebar.expander("⏱️ Perfil del rerun", expanded=True):
+        p1, p2 = st.columns(2)
+        p1.metric("Rerun", f"{perfil.total_ms():,.0f} ms")
+        p2.metric("RSS pico", f"{rss:,.0f} MB" if rss is not None else "n/d")
+        p1.metric("Cubo en memoria", f"{dataset.cubo.estimated_size('mb'):,.1f} MB")
+        if cubo_filtrado is None:
+            p2.metric("Cubo filtrado", "n/d", help="Con el pool activo el cubo filtrado se calcula en los procesos")
+        else:
+            p2.metric("Cubo filtrado", f"{cubo_filtrado.estimated_size('mb'):,.2f} MB",
+                      help=f"{cubo_filtrado.height:,} celdas")
+        # Solo si ya existen: el panel no debe construirlos
+        bocetos_dataset = dataset.derivados()[1]
+        if bocetos_dataset is None:
+            p1.metric("Bocetos", "n/d", help="Se construyen la primera vez que se usa el modo aproximado")
+        else:
+            p1.metric("Bocetos", f"{bocetos_dataset.tamano_mb():,.2f} MB",
+                      help=f"{bocetos_dataset.hll.height:,} registros HLL · {bocetos_dataset.frecuentes.height:,} frecuentes")
+        # st.dataframe permite ordenar por cualquier columna desde el encabezado
+        st.dataframe(
+            perfil.tabla().sort("MS", descending=True),
+            hide_index=True,
+            column_config={
+                "MS": st.column_config.NumberColumn(format="%.1f"),
+                "PCT_RERUN": st.column_config.NumberColumn("% rerun", format="%.1f")
+            }
+        )
@@ -0,0 +1,231 @@
+"""Reportes estáticos del tablero para muchos estados de filtros, sin Streamlit.
+
+Lee una lista de especificaciones (ver monitor_crc.reportes.leer_especificaciones),
+calcula las tablas de las pestañas por lotes que agrupan las especificaciones por la
+dimensión que varía, y escribe:
+
+    <salida>/parquet/<tabla>.parquet   la tabla de todos los reportes, con la columna REPORTE
+    <salida>/html/<reporte>.html       una página por reporte con los gráficos y tablas de cada pestaña
+    <salida>/html/index.html           índice de los reportes (las páginas usan plotly.min.js
+                                       del mismo directorio, sin conexión)
+
+Los gráficos son los del tablero (monitor_crc.graficos), armados en este proceso a partir
+de las tablas ya calculadas.
+
+Uso:
+    python generar_reportes.py --especificaciones reportes.json
+    python generar_reportes.py --especificaciones reportes.json --salida ./reportes_crc --procesos 8
+"""
+import argparse
+import html
+import os
+import re
+import time
+from dataclasses import fields
+
+import plotly.graph_objects as go
+import plotly.io as pio
+import plotly.offline
+import polars as pl
+
+from monitor_crc import CatalogoDatos, graficos
+from monitor_crc.agregados import AGREGADOS_PESTANAS
+from monitor_crc.ingesta import DIRECTORIO_ALMACEN, PATRON_CRUDOS
+from monitor_crc.instantanea import DIRECTORIO_INSTANTANEA
+from monitor_crc.reportes import agrupar, calcular_reportes, leer_especificaciones
+from monitor_crc.trabajadores import PoolConsultas
+
+TITULOS_PESTANAS = {
+    "general": "📊 General",
+    "financiero": "💰 Financiero",
+    "tendencias": "📈 Tendencias",
+    "conectividad": "📶 Conectividad",
+    "competencia": "🏆 Competencia",
+    "segmentacion": "🎯 Segmentación",
+    "geografico": "📍 Geográfico"
+}
+
+# Tablas sin gráfico; los indicadores van arriba de los gráficos, como en el tablero
+TITULOS_TABLAS = {
+    "kpis": "Indicadores",
+    "low_speed_munis": "Municipios con menor velocidad de bajada",
+    "tabla_resumen": "Resumen por municipio"
+}
+FILAS_TABLA = 50  # Filas de las tablas HTML (el Parquet lleva todas)
+
+ESTILO = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; font-size: 0.85em; margin-bottom: 1.5em; }
+th, td { border: 1px solid #ddd; padding: 4px 8px; text-align: right; }
+th { background: #f4f4f4; }
+.graficos { display: grid; grid-template-columns: repeat(auto-fit, minmax(480px, 1fr)); gap: 1em; }
+"""
+
+
+def nombre_archivo(nombre):
+    return re.sub(r"[^\w.-]+", "_", nombre).strip("_") or "reporte"
+
+
+def describir(filtros):
+    partes = []
+    for campo in fields(filtros):
+        valor = getattr(filtros, campo.name)
+        if valor:
+            partes.append(f"{campo.name}: {', '.join(map(str, valor))}")
+    return " · ".join(partes) or "Sin filtros"
+
+
+def celda(valor):
+    if valor is None:
+        return "—"
+    if isinstance(valor, float):
+        return f"{valor:,.2f}"
+    if isinstance(valor, int):
+        return f"{valor:,}"
+    return html.escape(str(valor))
+
+
+def tabla_html(tabla):
+    encabezado = "".join(f"<th>{html.escape(c)}</th>" for c in tabla.columns)
+    filas = "".join(
+        "<tr>" + "".join(f"<td>{celda(v)}</td>" for v in fila) + "</tr>"
+        for fila in tabla.head(FILAS_TABLA).iter_rows()
+    )
+    return f"<table><tr>{encabezado}</tr>{filas}</table>"
+
+
+def plantillas():
+    """(completa, ligera): la plantilla por defecto como dict y otra con solo los colores que px toma de ella.
+
+    Plotly valida la plantilla de cada figura, y la completa es casi la mitad de lo que
+    cuesta armarla. Las figuras se arman con la ligera (`plantilla=` de cada función de
+    `graficos`) y `figura_html` pone la completa al serializar: el JSON es el mismo.
+    """
+    completa = pio.templates[pio.templates.default].to_plotly_json()
+    ligera = go.layout.Template(layout={
+        "colorway": completa["layout"]["colorway"],
+        "colorscale": {"sequential": completa["layout"]["colorscale"]["sequential"]}
+    })
+    return completa, ligera
+
+
+def figura_html(figura, plantilla, con_plotlyjs):
+    """Div de la figura con `plantilla` (dict); con `con_plotlyjs`, precedido del <script> a plotly.min.js."""
+    figura = figura.to_dict()
+    figura["layout"]["template"] = plantilla
+    return pio.to_html(
+        figura, full_html=False, include_plotlyjs="directory" if con_plotlyjs else False, validate=False
+    )
+
+
+def escribir_html(ruta, nombre, filtros, pestanas, completa, ligera):
+    """Página de un reporte: por pestaña, sus indicadores, sus gráficos y sus demás tablas (ver `plantillas`)."""
+    secciones = []
+    con_plotlyjs = True  # Solo la primera figura de la página carga plotly.min.js
+    for pestana, tablas in pestanas.items():
+        indicadores, figuras, otras = [], [], []
+        for tabla, df in tablas.items():
+            if tabla not in graficos.POR_TABLA:
+                destino = indicadores if tabla == "kpis" else otras
+                destino.append(f"<h4>{TITULOS_TABLAS.get(tabla, tabla)}</h4>" + tabla_html(df))
+            elif df.is_empty():
+                figuras.append(f"<div><h4>{graficos.POR_TABLA[tabla][0]}</h4><p>Sin datos</p></div>")
+            else:
+                titulo, construir = graficos.POR_TABLA[tabla]
+                figura = figura_html(construir(df, plantilla=ligera), completa, con_plotlyjs)
+                con_plotlyjs = False
+                figuras.append(f"<div><h4>{titulo}</h4>{figura}</div>")
+        secciones.append(
+            f"<h2>{TITULOS_PESTANAS[pestana]}</h2>{''.join(indicadores)}"
+            f"<div class='graficos'>{''.join(figuras)}</div>{''.join(otras)}"
+        )
+
+    with open(ruta, "w", encoding="utf-8") as destino:
+        destino.write(
+            f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(nombre)}</title>"
+            f"<style>{ESTILO}</style></head><body>"
+            f"<p><a href='index.html'>← Reportes</a></p><h1>{html.escape(nombre)}</h1>"
+            f"<p>{html.escape(describir(filtros))}</p>{''.join(secciones)}</body></html>"
+        )
+
+
+def escribir_parquet(directorio, especificaciones, reportes):
+    """Un archivo por tabla con las filas de todos los reportes y su nombre en REPORTE."""
+    os.makedirs(directorio, exist_ok=True)
+    por_tabla = {}
+    for especificacion in especificaciones:
+        for tablas in reportes[especificacion.nombre].values():
+            for tabla, df in tablas.items():
+                partes = por_tabla.setdefault(tabla, {})
+                partes[especificacion.nombre] = df  # kpis se repite entre pestañas
+    for tabla, partes in por_tabla.items():
+        pl.concat([
+            df.select(pl.lit(nombre).alias("REPORTE"), pl.all()) for nombre, df in partes.items()
+        ], how="vertical_relaxed").write_parquet(os.path.join(directorio, f"{tabla}.parquet"))
+
+
+def escribir_paginas(directorio, especificaciones, reportes):
+    """Páginas de los reportes e índice; plotly.min.js se escribe una vez para todas."""
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, "plotly.min.js"), "w", encoding="utf-8") as destino:
+        destino.write(plotly.offline.get_plotlyjs())
+
+    archivos = {e.nombre: nombre_archivo(e.nombre) + ".html" for e in especificaciones}
+    completa, ligera = plantillas()
+    for e in especificaciones:
+        escribir_html(
+            os.path.join(directorio, archivos[e.nombre]), e.nombre, e.filtros, reportes[e.nombre], completa, ligera
+        )
+
+    enlaces = "".join(
+        f"<li><a href='{html.escape(archivos[e.nombre])}'>{html.escape(e.nombre)}</a> "
+        f"<small>{html.escape(describir(e.filtros))}</small></li>"
+        for e in especificaciones
+    )
+    with open(os.path.join(directorio, "index.html"), "w", encoding="utf-8") as destino:
+        destino.write(
+            f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Reportes</title>"
+            f"<style>{ESTILO}</style></head><body><h1>Reportes</h1><ul>{enlaces}</ul></body></html>"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reportes HTML/Parquet del tablero para una lista de filtros.")
+    parser.add_argument("--especificaciones", required=True, help="JSON con la lista de estados de filtros")
+    parser.add_argument("--origen", default=PATRON_CRUDOS, help="Patrón glob de los shards crudos")
+    parser.add_argument("--almacen", default=DIRECTORIO_ALMACEN, help="Almacén compactado, si existe")
+    parser.add_argument("--salida", default="./reportes_crc")
+    parser.add_argument("--pestanas", nargs="+", choices=list(AGREGADOS_PESTANAS), default=list(AGREGADOS_PESTANAS))
+    parser.add_argument("--formatos", nargs="+", choices=["html", "parquet"], default=["html", "parquet"])
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="Procesos para calcular los lotes (1: todo en este proceso)")
+    args = parser.parse_args()
+
+    # La misma instantánea que el tablero: si ya hay una para estos archivos, no se recalcula el cubo
+    inicio = time.perf_counter()
+    dataset = CatalogoDatos(args.origen, args.almacen, 1, DIRECTORIO_INSTANTANEA).actualizar()
+    if dataset is None:
+        raise SystemExit(f"No se encontraron archivos con el patrón: {args.origen}")
+    especificaciones = leer_especificaciones(args.especificaciones, dataset)
+    lotes = agrupar(especificaciones)
+    print(f"{len(especificaciones)} reportes en {len(lotes)} lotes · carga {time.perf_counter() - inicio:.1f} s")
+
+    inicio = time.perf_counter()
+    pool = PoolConsultas(args.procesos) if args.procesos > 1 else None
+    try:
+        reportes = calcular_reportes(dataset, especificaciones, args.pestanas, pool)
+    finally:
+        if pool is not None:
+            pool.cerrar()
+    print(f"tablas: {time.perf_counter() - inicio:.1f} s")
+
+    inicio = time.perf_counter()
+    if "parquet" in args.formatos:
+        escribir_parquet(os.path.join(args.salida, "parquet"), especificaciones, reportes)
+    if "html" in args.formatos:
+        escribir_paginas(os.path.join(args.salida, "html"), especificaciones, reportes)
+    print(f"archivos: {time.perf_counter() - inicio:.1f} s → {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Genera shards data_part_*.parquet sintéticos con el esquema crudo de la CRC.
+
+Las 14 columnas tienen los tipos de los archivos reales y cardinalidades parecidas:
+33 departamentos con su código DIVIPOLA, ~1.100 municipios, cientos de operadores con
+una cola larga (pocos concentran el mercado), seis años de trimestres y velocidades
+que dependen de la tecnología. Incluye algunos nulos y valores negativos para que
+los filtros del tablero tengan qué descartar.
+
+Uso:
+    python generar_sinteticos.py --filas 1M --destino ./sinteticos_1m
+    python generar_sinteticos.py --filas 100M --destino ./sinteticos_100m --filas-por-shard 5M
+"""
+import argparse
+import os
+
+import numpy as np
+import polars as pl
+
+# (DIVIPOLA, departamento, municipios, peso en registros)
+DEPARTAMENTOS = [
+    (5, "ANTIOQUIA", 125, 13.0), (8, "ATLÁNTICO", 23, 5.5), (11, "BOGOTÁ D.C.", 1, 16.0),
+    (13, "BOLÍVAR", 46, 4.2), (15, "BOYACÁ", 123, 2.6), (17, "CALDAS", 27, 2.0),
+    (18, "CAQUETÁ", 16, 0.7), (19, "CAUCA", 42, 2.4), (20, "CESAR", 25, 2.2),
+    (23, "CÓRDOBA", 30, 3.3), (25, "CUNDINAMARCA", 116, 6.4), (27, "CHOCÓ", 30, 0.9),
+    (41, "HUILA", 37, 2.2), (44, "LA GUAJIRA", 15, 1.8), (47, "MAGDALENA", 30, 2.7),
+    (50, "META", 29, 2.1), (52, "NARIÑO", 64, 3.1), (54, "NORTE DE SANTANDER", 40, 3.1),
+    (63, "QUINDÍO", 12, 1.1), (66, "RISARALDA", 14, 1.9), (68, "SANTANDER", 87, 4.5),
+    (70, "SUCRE", 26, 1.8), (73, "TOLIMA", 47, 2.6), (76, "VALLE DEL CAUCA", 42, 8.8),
+    (81, "ARAUCA", 7, 0.6), (85, "CASANARE", 19, 0.9), (86, "PUTUMAYO", 13, 0.7),
+    (88, "SAN ANDRÉS", 2, 0.15), (91, "AMAZONAS", 11, 0.15), (94, "GUAINÍA", 9, 0.1),
+    (95, "GUAVIARE", 4, 0.2), (97, "VAUPÉS", 6, 0.1), (99, "VICHADA", 4, 0.15)
+]
+
+SEGMENTOS = {
+    "Residencial - Estrato 1": 0.20, "Residencial - Estrato 2": 0.28, "Residencial - Estrato 3": 0.22,
+    "Residencial - Estrato 4": 0.09, "Residencial - Estrato 5": 0.04, "Residencial - Estrato 6": 0.03,
+    "Corporativo": 0.12, "Uso propio interno del operador": 0.02
+}
+PAQUETES = {
+    "Internet fijo": 0.40, "Internet fijo + Telefonía fija": 0.15, "Internet fijo + TV": 0.20,
+    "Internet fijo + Telefonía fija + TV": 0.25
+}
+# Tecnología: (peso, mediana de bajada en Mbps, relación subida/bajada)
+TECNOLOGIAS = {
+    "Fiber to the home (FTTH)": (0.30, 300.0, 0.9), "Cable": (0.30, 80.0, 0.15),
+    "xDSL": (0.15, 8.0, 0.1), "Inalámbrico": (0.15, 15.0, 0.3), "Satelital": (0.05, 20.0, 0.1),
+    "WiMAX": (0.02, 6.0, 0.3), "Otras tecnologías": (0.03, 10.0, 0.3)
+}
+OPERADORES_PRINCIPALES = [
+    "COMUNICACION CELULAR S A COMCEL S A", "COLOMBIA TELECOMUNICACIONES S.A. E.S.P. BIC",
+    "UNE EPM TELECOMUNICACIONES S.A.", "EMPRESA DE TELECOMUNICACIONES DE BOGOTA S.A. E.S.P.",
+    "DIRECTV COLOMBIA LTDA", "HV TELEVISION S.A.S.", "AZTECA COMUNICACIONES COLOMBIA S.A.S"
+]
+ANOS = range(2019, 2025)
+
+FILAS_POR_SHARD = 2_000_000
+
+
+def interpretar_filas(texto):
+    """'1M', '10M', '250K' o un entero."""
+    texto = texto.strip().upper().replace("_", "")
+    for sufijo, factor in (("M", 1_000_000), ("K", 1_000)):
+        if texto.endswith(sufijo):
+            return int(float(texto[:-1]) * factor)
+    return int(texto)
+
+
+def probabilidades(pesos):
+    pesos = np.asarray(pesos, dtype=float)
+    return pesos / pesos.sum()
+
+
+class Catalogo:
+    """Valores de cada dimensión y sus probabilidades, compartidos por todos los shards."""
+
+    def __init__(self, operadores):
+        self.divipola = np.array([d[0] for d in DEPARTAMENTOS])
+        self.departamentos = pl.Series([d[1] for d in DEPARTAMENTOS])
+        self.p_departamentos = probabilidades([d[3] for d in DEPARTAMENTOS])
+
+        # Municipios de todos los departamentos en una sola lista; el primero es la capital
+        self.municipios_por_depto = np.array([d[2] for d in DEPARTAMENTOS])
+        self.inicio_municipios = np.concatenate([[0], np.cumsum(self.municipios_por_depto)[:-1]])
+        self.municipios = pl.Series([
+            f"{nombre} {codigo:02d}{i * 3 + 1:03d}" if i else f"{nombre} CAPITAL"
+            for codigo, nombre, n, _ in DEPARTAMENTOS for i in range(n)
+        ])
+
+        # Cola larga tipo Zipf: unos pocos operadores nacionales y cientos de regionales
+        self.empresas = pl.Series(
+            OPERADORES_PRINCIPALES +
+            [f"OPERADOR REGIONAL {i:04d} S.A.S." for i in range(operadores - len(OPERADORES_PRINCIPALES))]
+        )
+        self.p_empresas = probabilidades(1 / np.arange(1, operadores + 1) ** 1.2)
+
+        self.segmentos = pl.Series(list(SEGMENTOS))
+        self.p_segmentos = probabilidades(list(SEGMENTOS.values()))
+        self.paquetes = pl.Series(list(PAQUETES))
+        self.p_paquetes = probabilidades(list(PAQUETES.values()))
+        self.tecnologias = pl.Series(list(TECNOLOGIAS))
+        self.p_tecnologias = probabilidades([t[0] for t in TECNOLOGIAS.values()])
+        self.mediana_bajada = np.array([t[1] for t in TECNOLOGIAS.values()])
+        self.relacion_subida = np.array([t[2] for t in TECNOLOGIAS.values()])
+
+
+def generar_shard(catalogo, filas, rng):
+    depto = rng.choice(len(DEPARTAMENTOS), filas, p=catalogo.p_departamentos)
+    # Municipio sesgado hacia la capital y los primeros municipios del departamento
+    local = np.floor(catalogo.municipios_por_depto[depto] * rng.random(filas) ** 3).astype(np.int64)
+    municipio = catalogo.inicio_municipios[depto] + local
+    tecnologia = rng.choice(len(TECNOLOGIAS), filas, p=catalogo.p_tecnologias)
+
+    bajada = catalogo.mediana_bajada[tecnologia] * rng.lognormal(0, 0.6, filas)
+    subida = bajada * catalogo.relacion_subida[tecnologia] * rng.lognormal(0, 0.3, filas)
+    facturado = rng.lognormal(11.5, 1.2, filas)
+    otros = rng.lognormal(8.0, 1.5, filas)
+
+    # Ruido de los datos reales: algunos nulos y ajustes negativos
+    facturado[rng.random(filas) < 0.001] *= -1
+    otros[rng.random(filas) < 0.002] *= -1
+
+    return pl.DataFrame({
+        "ANNO": rng.choice(np.array(ANOS), filas),
+        "TRIMESTRE": rng.integers(1, 5, filas),
+        "ID_DEPARTAMENTO": catalogo.divipola[depto],
+        "DEPARTAMENTO": catalogo.departamentos.gather(depto),
+        "MUNICIPIO": catalogo.municipios.gather(municipio),
+        "EMPRESA": catalogo.empresas.gather(rng.choice(len(catalogo.empresas), filas, p=catalogo.p_empresas)),
+        "SEGMENTO": catalogo.segmentos.gather(rng.choice(len(SEGMENTOS), filas, p=catalogo.p_segmentos)),
+        "SERVICIO_PAQUETE": catalogo.paquetes.gather(rng.choice(len(PAQUETES), filas, p=catalogo.p_paquetes)),
+        "TECNOLOGIA": catalogo.tecnologias.gather(tecnologia),
+        "VELOCIDAD_EFECTIVA_DOWNSTREAM": bajada,
+        "VELOCIDAD_EFECTIVA_UPSTREAM": subida,
+        "CANTIDAD_LINEAS_ACCESOS": rng.integers(1, 200, filas),
+        "VALOR_FACTURADO_O_COBRADO": facturado,
+        "OTROS_VALORES_FACTURADOS": otros
+    }).with_columns(
+        pl.when(pl.Series(rng.random(filas) < 0.01)).then(None)
+        .otherwise(pl.col("OTROS_VALORES_FACTURADOS")).alias("OTROS_VALORES_FACTURADOS"),
+        pl.when(pl.Series(rng.random(filas) < 0.005)).then(None)
+        .otherwise(pl.col("VELOCIDAD_EFECTIVA_UPSTREAM")).alias("VELOCIDAD_EFECTIVA_UPSTREAM")
+    )
+
+
+def generar(destino, filas, filas_por_shard=FILAS_POR_SHARD, operadores=400, semilla=0):
+    """Escribe ceil(filas / filas_por_shard) shards en `destino`; devuelve sus rutas."""
+    os.makedirs(destino, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    catalogo = Catalogo(operadores)
+
+    rutas = []
+    for parte, inicio in enumerate(range(0, filas, filas_por_shard)):
+        ruta = os.path.join(destino, f"data_part_{parte}.parquet")
+        generar_shard(catalogo, min(filas_por_shard, filas - inicio), rng).write_parquet(ruta)
+        rutas.append(ruta)
+    return rutas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera shards crudos sintéticos con la forma de los datos CRC.")
+    parser.add_argument("--filas", type=interpretar_filas, default="1M", help="Total de filas: 1M, 10M, 100M...")
+    parser.add_argument("--destino", default="./sinteticos")
+    parser.add_argument("--filas-por-shard", type=interpretar_filas, default=FILAS_POR_SHARD)
+    parser.add_argument("--operadores", type=int, default=400)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    rutas = generar(args.destino, args.filas, args.filas_por_shard, args.operadores, args.semilla)
+    print(f"{args.filas:,} filas en {len(rutas)} shards -> {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Mide, por pestaña, cuánto cuesta entregar los agregados a Plotly y st.dataframe.
+
+Compara la ruta anterior (.to_pandas() de cada tabla antes de graficar) con la actual,
+en la que los DataFrames de Polars llegan tal cual: Plotly los lee vía narwhals y
+st.dataframe los serializa como Arrow (to_arrow, sin copiar los buffers numéricos).
+Junto a cada conversión se reporta el tiempo de la agregación misma como referencia.
+
+Uso:
+    python medir_conversion.py
+    python medir_conversion.py --origen "./data_part_*.parquet" --repeticiones 5 --json conversion.json
+"""
+import argparse
+import json
+import time
+
+from monitor_crc import Dataset, Filtros, metricas
+from monitor_crc.ingesta import DIRECTORIO_ALMACEN, PATRON_CRUDOS
+
+
+def cronometrar(funcion, repeticiones):
+    """Mejor tiempo (ms) de `repeticiones` ejecuciones y el resultado de la última.
+
+    Una ejecución previa sin medir descarta importaciones perezosas (pandas) y cachés frías.
+    """
+    funcion()
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000, resultado
+
+
+def medir_pestana(dataset, pestana, repeticiones):
+    ms_agregacion, tablas = cronometrar(lambda: metricas.PESTANAS[pestana](dataset, Filtros()), repeticiones)
+    ms_pandas, _ = cronometrar(lambda: [t.to_pandas() for t in tablas.values()], repeticiones)
+    ms_arrow, _ = cronometrar(lambda: [t.to_arrow() for t in tablas.values()], repeticiones)
+    return {
+        "pestana": pestana,
+        "tablas": len(tablas),
+        "filas": sum(t.height for t in tablas.values()),
+        "kb": sum(t.estimated_size("kb") for t in tablas.values()),
+        "agregacion_ms": ms_agregacion,
+        "pandas_ms": ms_pandas,
+        "arrow_ms": ms_arrow
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo de conversión de los agregados de cada pestaña.")
+    parser.add_argument("--origen", default=PATRON_CRUDOS, help="Patrón glob de los shards crudos")
+    parser.add_argument("--almacen", default=DIRECTORIO_ALMACEN, help="Almacén compactado (si existe, se usa)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--json", help="Ruta opcional para guardar el resultado")
+    args = parser.parse_args()
+
+    try:
+        dataset = Dataset.abrir(args.origen, args.almacen)
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    filas = [medir_pestana(dataset, pestana, args.repeticiones) for pestana in metricas.PESTANAS]
+    cubo = dataset.cubo
+
+    print(f"Cubo: {cubo.height:,} celdas · mejor de {args.repeticiones} repeticiones")
+    print(f"{'pestaña':<14}{'tablas':>7}{'filas':>9}{'KB':>8}{'agregar ms':>12}{'pandas ms':>11}{'arrow ms':>10}")
+    for f in filas:
+        print(
+            f"{f['pestana']:<14}{f['tablas']:>7}{f['filas']:>9,}{f['kb']:>8.1f}"
+            f"{f['agregacion_ms']:>12.1f}{f['pandas_ms']:>11.2f}{f['arrow_ms']:>10.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as destino:
+            json.dump({"celdas_cubo": cubo.height, "repeticiones": args.repeticiones, "pestanas": filas},
+                      destino, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Mide la latencia del motor del tablero sin Streamlit: carga, filtros y agregación por pestaña.
+
+Etapas medidas:
+    carga        dominios, opciones y cubo, en frío (una sola vez, como al arrancar la app),
+                 el cubo en modo streaming (ver monitor_crc.memoria) y la misma carga desde
+                 una instantánea (ver monitor_crc.instantanea)
+    filtro       cubo filtrado materializado para cada combinación de filtros del sidebar
+    agregacion   métricas de cada pestaña con esos filtros (sin construir figuras)
+    velocidades  histograma Down vs Up sobre las filas crudas filtradas
+    concurrencia todas las pestañas de todos los escenarios pedidas por N sesiones a la vez,
+                 en hilos del mismo proceso y en el pool de procesos (opcional, --sesiones)
+
+El informe JSON lleva el commit, versiones y tamaño de los datos para comparar corridas:
+
+    python generar_sinteticos.py --filas 10M --destino ./sinteticos_10m
+    python medir_rendimiento.py --origen "./sinteticos_10m/data_part_*.parquet" --salida base.json
+    python medir_rendimiento.py --origen "./sinteticos_10m/data_part_*.parquet" --comparar base.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import polars as pl
+
+from monitor_crc import Dataset, Filtros, metricas
+from monitor_crc.agregados import construir_cubo
+from monitor_crc.dataset import extraer_opciones, filas_base
+from monitor_crc.filtros import PREDICADO_BASE
+from monitor_crc.ingesta import PATRON_CRUDOS, crear_fuente, escanear, firmar_archivos, listar_archivos
+from monitor_crc.instantanea import abrir_instantanea, guardar_instantanea
+from monitor_crc.memoria import MOTOR_STREAMING, materializar
+from monitor_crc.trabajadores import PoolConsultas
+
+BINS_VELOCIDADES = 70  # Los del presupuesto por defecto de la vista Down vs Up (5000 puntos)
+
+
+def cronometrar(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return (time.perf_counter() - inicio) * 1000, resultado
+
+
+def repetir(funcion, repeticiones):
+    """Tiempos (ms) de `repeticiones` ejecuciones tras una previa sin medir."""
+    funcion()
+    return [cronometrar(funcion)[0] for _ in range(repeticiones)]
+
+
+def escenarios(opciones, cubo):
+    """Combinaciones de filtros del sidebar, con valores tomados de los propios datos.
+
+    Cada escenario es (nombre, Filtros).
+    """
+    def mayores(columna, n):
+        return (
+            cubo.group_by(columna).agg(pl.col("REGISTROS").sum())
+            .sort("REGISTROS", descending=True).head(n)[columna].cast(pl.String).to_list()
+        )
+
+    ano = (opciones['anos'][-1],)
+    depto = tuple(mayores("DEPARTAMENTO", 1))
+    munis = tuple(opciones['jerarquia'][depto[0]]['municipios'][:2])
+    empresas = tuple(mayores("EMPRESA", 3))
+    medio_facturado = (0.0, opciones['max_val_facturado'] / 2)
+    medio_otros = (0.0, opciones['max_otros'] / 2)
+
+    return [
+        ("sin_filtros", Filtros()),
+        ("ano", Filtros(anos=ano)),
+        ("departamento", Filtros(departamentos=depto)),
+        ("departamento_municipio", Filtros(departamentos=depto, municipios=munis)),
+        ("empresa", Filtros(empresas=empresas)),
+        ("paquete_tecnologia", Filtros(
+            paquetes=tuple(opciones['paquetes'][:1]), tecnologias=tuple(opciones['tecnologias'][:2])
+        )),
+        ("combinado", Filtros(anos=ano, departamentos=depto, empresas=empresas)),
+        ("sliders_financieros", Filtros(val_facturado=medio_facturado, otros_valores=medio_otros)),
+        ("combinado_sliders", Filtros(
+            anos=ano, departamentos=depto, val_facturado=medio_facturado, otros_valores=medio_otros
+        ))
+    ]
+
+
+def medir(origen, almacen, repeticiones, sesiones=0, procesos=None):
+    if almacen:
+        archivos, es_almacen = listar_archivos(origen, almacen)
+    else:
+        archivos, es_almacen = sorted(glob.glob(origen)), False
+    if not archivos:
+        raise SystemExit(f"No se encontraron archivos con el patrón: {origen}")
+
+    resultados = []
+
+    def registrar(etapa, escenario, pestana, tiempos):
+        resultados.append({
+            "etapa": etapa, "escenario": escenario, "pestana": pestana,
+            "mejor_ms": min(tiempos), "mediana_ms": statistics.median(tiempos), "repeticiones": len(tiempos)
+        })
+
+    # 1. Carga en frío, en el mismo orden que Dataset.cargar
+    ms, fuente = cronometrar(lambda: crear_fuente(archivos, es_almacen))
+    registrar("carga", None, "dominios", [ms])
+    ms, opciones = cronometrar(lambda: extraer_opciones(fuente))
+    registrar("carga", None, "opciones", [ms])
+    ms, cubo = cronometrar(lambda: construir_cubo(escanear(fuente, PREDICADO_BASE)).collect())
+    registrar("carga", None, "cubo", [ms])
+    dataset = Dataset(fuente, opciones, cubo)
+
+    # El mismo cubo un año por vez con el motor de streaming, mapeado desde disco
+    ms, _ = cronometrar(lambda: materializar(
+        lambda p: construir_cubo(filas_base(fuente, p)), opciones['anos'], MOTOR_STREAMING
+    ))
+    registrar("carga", None, "cubo_streaming", [ms])
+
+    # Arranque de un proceso nuevo con la instantánea ya escrita por otro
+    with tempfile.TemporaryDirectory() as directorio:
+        firmas = firmar_archivos(archivos)
+        guardar_instantanea(dataset, firmas, directorio)
+        registrar("carga", None, "instantanea", repetir(
+            lambda: abrir_instantanea(firmas, directorio), repeticiones
+        ))
+
+    # 2. Filtros y métricas de cada pestaña, como las pide el tablero
+    combinaciones = escenarios(opciones, cubo)
+    for nombre, filtros in combinaciones:
+        registrar("filtro", nombre, None, repetir(dataset.filtrar(filtros).collect, repeticiones))
+        for pestana, calcular in metricas.PESTANAS.items():
+            registrar("agregacion", nombre, pestana, repetir(
+                lambda: calcular(dataset, filtros), repeticiones
+            ))
+        registrar("velocidades", nombre, "densidad", repetir(
+            lambda: metricas.densidad_velocidades(dataset, filtros, BINS_VELOCIDADES), repeticiones
+        ))
+
+    # 3. Sesiones concurrentes: las mismas consultas repartidas entre `sesiones` hilos
+    if sesiones:
+        consultas = [(calcular, filtros) for _, filtros in combinaciones for calcular in metricas.PESTANAS.values()]
+
+        def en_sesiones(ejecutar):
+            with ThreadPoolExecutor(sesiones) as hilos:
+                list(hilos.map(lambda consulta: ejecutar(consulta[0], dataset, consulta[1]), consultas))
+
+        escenario = f"{sesiones}_sesiones"
+        registrar("concurrencia", escenario, "hilos", repetir(
+            lambda: en_sesiones(lambda calcular, *args: calcular(*args)), repeticiones
+        ))
+        pool = PoolConsultas(procesos)
+        try:
+            registrar("concurrencia", escenario, f"pool_{pool.procesos}", repetir(
+                lambda: en_sesiones(pool.ejecutar), repeticiones
+            ))
+        finally:
+            pool.cerrar()
+
+    filas = escanear(fuente).select(pl.len()).collect().item()
+    return {
+        "metadatos": metadatos(archivos, es_almacen, filas, cubo.height, repeticiones),
+        "resultados": resultados
+    }
+
+
+def metadatos(archivos, es_almacen, filas, celdas_cubo, repeticiones):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "plataforma": platform.platform(),
+        "archivos": len(archivos),
+        "almacen": es_almacen,
+        "filas": filas,
+        "celdas_cubo": celdas_cubo,
+        "repeticiones": repeticiones
+    }
+
+
+def clave(resultado):
+    return resultado["etapa"], resultado["escenario"], resultado["pestana"]
+
+
+def imprimir(informe, base=None):
+    m = informe["metadatos"]
+    print(f"{m['filas']:,} filas · {m['archivos']} archivos · cubo de {m['celdas_cubo']:,} celdas · commit {m['commit']}")
+
+    previos = {clave(r): r for r in base["resultados"]} if base else {}
+    encabezado = f"{'etapa':<14}{'escenario':<24}{'pestaña':<14}{'mejor ms':>10}{'mediana ms':>12}"
+    print(encabezado + (f"{'base ms':>10}{'cambio':>9}" if base else ""))
+    for r in informe["resultados"]:
+        linea = (
+            f"{r['etapa']:<14}{r['escenario'] or '-':<24}{r['pestana'] or '-':<14}"
+            f"{r['mejor_ms']:>10.1f}{r['mediana_ms']:>12.1f}"
+        )
+        previo = previos.get(clave(r))
+        if previo:
+            linea += f"{previo['mejor_ms']:>10.1f}{r['mejor_ms'] / max(previo['mejor_ms'], 1e-9):>8.2f}x"
+        print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de carga, filtros y agregación por pestaña.")
+    parser.add_argument("--origen", default=PATRON_CRUDOS, help="Patrón glob de los shards crudos")
+    parser.add_argument("--almacen", help="Almacén compactado a medir en lugar de los shards crudos (p. ej. ./datos_crc)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--salida", help="Ruta del informe JSON")
+    parser.add_argument("--comparar", help="Informe JSON previo contra el que comparar")
+    parser.add_argument("--sesiones", type=int, default=0, help="Sesiones concurrentes a simular (0: no medir)")
+    parser.add_argument("--procesos", type=int, help="Procesos del pool de consultas (por defecto, uno por núcleo)")
+    args = parser.parse_args()
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as origen:
+            base = json.load(origen)
+
+    informe = medir(args.origen, args.almacen, args.repeticiones, args.sesiones, args.procesos)
+    imprimir(informe, base)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as destino:
+            json.dump(informe, destino, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""Núcleo analítico del Monitor CRC, sin dependencias de Streamlit.
+
+    from monitor_crc import Dataset, Filtros, metricas
+
+    dataset = Dataset.abrir("./data_part_*.parquet")
+    tablas = metricas.general(dataset, Filtros(departamentos=("ANTIOQUIA",)))
+"""
+from . import metricas
+from .dataset import CacheResultados, CatalogoDatos, Dataset, FiltradoIncremental
+from .filtros import Filtros
+
+__all__ = ["CacheResultados", "CatalogoDatos", "Dataset", "FiltradoIncremental", "Filtros", "metricas"]
@@ -0,0 +1,344 @@
+"""Motor de agregación: cubo, plan de agregaciones por pestaña y consultas sobre filas crudas.
+
+El cubo agrega las filas al grano de DIMENSIONES_CUBO con medidas re-agregables; cada
+pestaña declara sus tablas en un PlanAgregaciones que las resuelve en una sola pasada.
+"""
+import io
+import json
+import time
+
+import polars as pl
+import polars.selectors as cs
+
+from .perfil import activo_en_hilo, registro_perfil
+
+# Grano más fino de los gráficos: todas las pestañas re-agregan desde aquí
+DIMENSIONES_CUBO = [
+    "ANNO", "PERIODO", "ID_DEPTO_MAPA", "DEPARTAMENTO", "MUNICIPIO",
+    "EMPRESA", "SEGMENTO", "SERVICIO_PAQUETE", "TECNOLOGIA"
+]
+
+
+def construir_cubo(lf):
+    """Agrega las filas al grano de DIMENSIONES_CUBO con medidas re-agregables (conteos y sumas)."""
+    return lf.group_by(DIMENSIONES_CUBO).agg([
+        pl.len().alias("REGISTROS"),
+        pl.col("VALOR_FACTURADO_O_COBRADO").sum(),
+        pl.col("OTROS_VALORES_FACTURADOS").sum(),
+        pl.col("VALOR_TOTAL").sum(),
+        pl.col("CANTIDAD_LINEAS_ACCESOS").sum(),
+        # Las velocidades se guardan como suma + conteo para recomponer promedios exactos
+        pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").sum().alias("SUMA_VELOCIDAD_EFECTIVA_DOWNSTREAM"),
+        pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").count().alias("N_VELOCIDAD_EFECTIVA_DOWNSTREAM"),
+        pl.col("VELOCIDAD_EFECTIVA_UPSTREAM").sum().alias("SUMA_VELOCIDAD_EFECTIVA_UPSTREAM"),
+        pl.col("VELOCIDAD_EFECTIVA_UPSTREAM").count().alias("N_VELOCIDAD_EFECTIVA_UPSTREAM")
+    ])
+
+
+def combinar_cubos(cubos):
+    """Suma cubos parciales (p. ej. de shards distintos) celda a celda."""
+    return pl.concat(cubos).group_by(DIMENSIONES_CUBO).agg(pl.exclude(DIMENSIONES_CUBO).sum())
+
+
+# Columna auxiliar de `PlanAgregaciones.ejecutar_por`
+PARTICION = "_PARTICION"
+
+# Re-agregaciones sobre el cubo (conservan los nombres de columna que usan los gráficos)
+CONTEO = pl.col("REGISTROS").sum().alias("len")
+
+
+def promedio(columna):
+    n = pl.col(f"N_{columna}").sum()
+    return pl.when(n > 0).then(pl.col(f"SUMA_{columna}").sum() / n).alias(columna)
+
+
+class PlanAgregaciones:
+    """Reúne las agregaciones de la página y las ejecuta en una sola pasada con pl.collect_all.
+
+    Las consultas que agrupan por las mismas claves comparten un único group_by con todas
+    sus medidas; cada consulta selecciona luego sus columnas y aplica su post-proceso
+    (orden, top-N...). Polars comparte los sub-planes comunes y ejecuta todo en paralelo.
+    """
+
+    def __init__(self, fuente, motor="auto"):
+        self.fuente = fuente
+        self.motor = motor  # Motor de Polars de collect_all (ver memoria)
+        self.grupos = {}      # frozenset(claves) -> (claves, {alias: expresión})
+        self.consultas = {}   # nombre -> (claves, aliases, post)
+
+    def agregar(self, nombre, por, medidas, post=None):
+        claves = [por] if isinstance(por, str) else list(por)
+        _, grupo = self.grupos.setdefault(frozenset(claves), (claves, {}))
+
+        aliases = []
+        for expr in medidas:
+            alias = expr.meta.output_name()
+            previa = grupo.setdefault(alias, expr)
+            if not previa.meta.eq(expr):
+                raise ValueError(f"La medida '{alias}' ya está definida con otra expresión para {claves}")
+            aliases.append(alias)
+
+        self.consultas[nombre] = (claves, aliases, post)
+
+    def quitar(self, nombres):
+        """Descarta consultas ya declaradas (p. ej. las que se resuelven por otra vía)."""
+        for nombre in nombres:
+            self.consultas.pop(nombre, None)
+
+    def bases(self, particion=None):
+        """Un group_by por cada juego de claves que alguna consulta vigente usa.
+
+        Con `particion`, esa columna se suma a las claves de todos como PARTICION (con
+        otro nombre para no chocar con medidas como `pl.col("DEPARTAMENTO").n_unique()`).
+        """
+        usados = {frozenset(claves) for claves, _, _ in self.consultas.values()}
+        bases = {}
+        for llave, (claves, medidas) in self.grupos.items():
+            if llave not in usados:
+                continue
+            if particion:
+                claves = claves + [pl.col(particion).alias(PARTICION)]
+            if claves:
+                bases[llave] = self.fuente.group_by(claves).agg(list(medidas.values()))
+            else:
+                bases[llave] = self.fuente.select(list(medidas.values()))
+        return bases
+
+    def consultas_sobre(self, bases):
+        consultas = []
+        for claves, aliases, post in self.consultas.values():
+            lf = bases[frozenset(claves)].select(claves + aliases)
+            consultas.append(post(lf) if post else lf)
+
+        # Las tablas agregadas son pequeñas: salen como texto para que pandas/Plotly
+        # no arrastren el dominio completo de cada Enum como categorías vacías
+        return [lf.with_columns(cs.enum().cast(pl.String)) for lf in consultas]
+
+    def ejecutar(self):
+        return dict(zip(self.consultas, pl.collect_all(self.consultas_sobre(self.bases()), engine=self.motor)))
+
+    def ejecutar_por(self, columna, valores):
+        """Las mismas tablas que `ejecutar` para cada valor de `columna`: {valor: {nombre: DataFrame}}.
+
+        La fuente se agrega una sola vez, con `columna` sumada a las claves de cada
+        group_by; cada valor filtra después esas bases, que ya son pequeñas, y aplica
+        el post-proceso de sus consultas. Equivale a ejecutar el plan sobre la fuente
+        filtrada por cada valor, sin recorrerla una vez por valor.
+        """
+        bases = self.bases(columna)
+        bases = dict(zip(bases, pl.collect_all(list(bases.values()), engine=self.motor)))
+
+        def base_de(llave, valor):
+            lf = bases[llave].lazy().filter(pl.col(PARTICION) == valor).drop(PARTICION)
+            claves, medidas = self.grupos[llave]
+            if not claves:
+                # Sin claves, `ejecutar` da una fila aun sin datos (conteos en 0): la del valor
+                # o, si no tiene filas, la de la fuente vacía
+                vacia = self.fuente.clear().select(list(medidas.values()))
+                lf = pl.concat([lf, vacia], how="vertical_relaxed").head(1)
+            return lf
+
+        consultas = []
+        for valor in valores:
+            consultas += self.consultas_sobre({llave: base_de(llave, valor) for llave in bases})
+        tablas = pl.collect_all(consultas, engine=self.motor)
+        n = len(self.consultas)
+        return {
+            valor: dict(zip(self.consultas, tablas[i * n:(i + 1) * n])) for i, valor in enumerate(valores)
+        }
+
+
+# Post-procesos habituales de las consultas del plan
+def ordenar(columna, descending=False):
+    return lambda lf: lf.sort(columna, descending=descending)
+
+
+def primeros(columna, n):
+    return lambda lf: lf.sort(columna, descending=True).head(n)
+
+
+def top_n_por(lf, columna, medida, n):
+    """Conserva las filas de las n categorías de `columna` con mayor suma de `medida`."""
+    top = lf.group_by(columna).agg(pl.col(medida).sum()).sort(medida, descending=True).head(n)
+    return lf.join(top.select(columna), on=columna, how="semi")
+
+
+def agregar_kpis(plan):
+    """Indicadores globales que muestran las pestañas General, Financiero y Conectividad."""
+    plan.agregar("kpis", [], [
+        pl.col("REGISTROS").sum(),
+        pl.col("DEPARTAMENTO").n_unique(),
+        pl.col("MUNICIPIO").n_unique(),
+        pl.col("EMPRESA").n_unique(),
+        pl.col("VALOR_FACTURADO_O_COBRADO").sum(),
+        pl.col("OTROS_VALORES_FACTURADOS").sum(),
+        pl.col("VALOR_TOTAL").sum(),
+        pl.col("CANTIDAD_LINEAS_ACCESOS").sum(),
+        promedio("VELOCIDAD_EFECTIVA_DOWNSTREAM"),
+        promedio("VELOCIDAD_EFECTIVA_UPSTREAM")
+    ])
+
+
+def agregados_general(plan):
+    agregar_kpis(plan)
+    plan.agregar("map_data", ["ID_DEPTO_MAPA", "DEPARTAMENTO"], [CONTEO])
+    plan.agregar("muni_data", "MUNICIPIO", [CONTEO], primeros("len", 10))
+    plan.agregar("serv_data", "SERVICIO_PAQUETE", [CONTEO])
+    plan.agregar("seg_data", "SEGMENTO", [CONTEO], ordenar("len"))
+
+
+def agregados_financiero(plan):
+    agregar_kpis(plan)
+    plan.agregar("val_paq", "SERVICIO_PAQUETE", [pl.col("VALOR_TOTAL").sum()])
+    plan.agregar("val_op", "EMPRESA", [pl.col("VALOR_TOTAL").sum()], primeros("VALOR_TOTAL", 10))
+    plan.agregar("val_tec", "TECNOLOGIA", [pl.col("VALOR_TOTAL").sum()], ordenar("VALOR_TOTAL", descending=True))
+
+
+def agregados_tendencias(plan):
+    plan.agregar("df_temp", "PERIODO", [
+        pl.col("REGISTROS").sum(),
+        pl.col("VALOR_TOTAL").sum(),
+        pl.col("CANTIDAD_LINEAS_ACCESOS").sum()
+    ], ordenar("PERIODO"))
+    plan.agregar("tec_trend", ["PERIODO", "TECNOLOGIA"], [CONTEO], ordenar("PERIODO"))
+    plan.agregar("paq_trend", ["PERIODO", "SERVICIO_PAQUETE"], [CONTEO], ordenar("PERIODO"))
+    plan.agregar("vel_trend", "PERIODO", [promedio("VELOCIDAD_EFECTIVA_DOWNSTREAM")], ordenar("PERIODO"))
+    plan.agregar("heat_data", ["PERIODO", "EMPRESA"], [CONTEO],
+                 lambda lf: top_n_por(lf, "EMPRESA", "len", 5).sort("PERIODO"))
+
+
+def agregados_conectividad(plan):
+    agregar_kpis(plan)
+    plan.agregar("lin_tec", "TECNOLOGIA", [pl.col("CANTIDAD_LINEAS_ACCESOS").sum()])
+    plan.agregar("lin_seg", "SEGMENTO", [pl.col("CANTIDAD_LINEAS_ACCESOS").sum()], ordenar("CANTIDAD_LINEAS_ACCESOS", descending=True))
+    plan.agregar("vel_depto", "DEPARTAMENTO", [promedio("VELOCIDAD_EFECTIVA_DOWNSTREAM")],
+                 primeros("VELOCIDAD_EFECTIVA_DOWNSTREAM", 10))
+
+
+def agregados_competencia(plan):
+    plan.agregar("share_val", "EMPRESA", [pl.col("VALOR_TOTAL").sum()], primeros("VALOR_TOTAL", 8))
+    plan.agregar("share_vol", "EMPRESA", [CONTEO], primeros("len", 8))
+    plan.agregar("dom_op", ["DEPARTAMENTO", "EMPRESA"], [CONTEO],
+                 lambda lf: lf.sort("len", descending=True).group_by("DEPARTAMENTO").first())
+    plan.agregar("div_op", ["EMPRESA", "TECNOLOGIA"], [CONTEO],
+                 lambda lf: top_n_por(lf, "EMPRESA", "len", 8))
+
+
+def agregados_segmentacion(plan):
+    plan.agregar("seg_dist", "SEGMENTO", [CONTEO], ordenar("len", descending=True))
+    plan.agregar("seg_val", "SEGMENTO", [pl.col("VALOR_TOTAL").sum()], ordenar("VALOR_TOTAL", descending=True))
+    plan.agregar("seg_tec", ["SEGMENTO", "TECNOLOGIA"], [CONTEO])
+    plan.agregar("seg_vel", "SEGMENTO", [promedio("VELOCIDAD_EFECTIVA_DOWNSTREAM")],
+                 ordenar("VELOCIDAD_EFECTIVA_DOWNSTREAM", descending=True))
+
+
+def agregados_geografico(plan):
+    plan.agregar("map_rev_data", ["ID_DEPTO_MAPA", "DEPARTAMENTO"], [pl.col("VALOR_TOTAL").sum()])
+    plan.agregar("top_munis", "MUNICIPIO", [pl.col("VALOR_TOTAL").sum()], primeros("VALOR_TOTAL", 10))
+    plan.agregar("low_speed_munis", "MUNICIPIO", [promedio("VELOCIDAD_EFECTIVA_DOWNSTREAM")],
+                 lambda lf: lf.sort("VELOCIDAD_EFECTIVA_DOWNSTREAM").head(10))
+    plan.agregar("tabla_resumen", ["DEPARTAMENTO", "MUNICIPIO"], [
+        pl.col("REGISTROS").sum().alias("TOTAL_REGISTROS"),
+        pl.col("VALOR_TOTAL").sum().alias("TOTAL_INGRESOS"),
+        promedio("VELOCIDAD_EFECTIVA_DOWNSTREAM").alias("VEL_BAJADA_PROM"),
+        pl.col("CANTIDAD_LINEAS_ACCESOS").sum().alias("TOTAL_ACCESOS")
+    ], ordenar("TOTAL_INGRESOS", descending=True))
+
+
+# Agregaciones que necesita cada pestaña; se resuelven solo cuando la pestaña está abierta
+AGREGADOS_PESTANAS = {
+    "general": agregados_general,
+    "financiero": agregados_financiero,
+    "tendencias": agregados_tendencias,
+    "conectividad": agregados_conectividad,
+    "competencia": agregados_competencia,
+    "segmentacion": agregados_segmentacion,
+    "geografico": agregados_geografico
+}
+
+
+def calcular_agregados(cubo_filtrado, pestana, omitir=(), motor="auto"):
+    """Declara las agregaciones de una pestaña y las resuelve juntas, salvo las de `omitir`."""
+    plan = PlanAgregaciones(cubo_filtrado, motor)
+    AGREGADOS_PESTANAS[pestana](plan)
+    plan.quitar(omitir)
+
+    inicio = time.perf_counter()
+    tablas = plan.ejecutar()
+    # Una línea JSON por ejecución, solo en los hilos de sesiones en modo perfil
+    if activo_en_hilo():
+        registro_perfil.info(json.dumps({
+            "evento": "agregacion",
+            "pestana": pestana,
+            "group_bys": len({frozenset(claves) for claves, _, _ in plan.consultas.values()}),
+            "tablas": len(tablas),
+            "filas": sum(t.height for t in tablas.values()),
+            "ms": round((time.perf_counter() - inicio) * 1000, 2)
+        }))
+    return tablas
+
+
+def histograma_velocidades(lf, bins):
+    """Histograma 2D Down x Up sobre todas las filas filtradas, con bins en escala log10(1 + Mbps).
+
+    Devuelve una fila por celda no vacía (bin_x, bin_y, REGISTROS) y el máximo de cada eje
+    para reconstruir los centros de los bins.
+    """
+    ejes = lf.select([
+        (pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").clip(lower_bound=0) + 1).log10().alias("x"),
+        (pl.col("VELOCIDAD_EFECTIVA_UPSTREAM").clip(lower_bound=0) + 1).log10().alias("y")
+    ]).drop_nulls()
+
+    def bin_de(eje):
+        tope = pl.max_horizontal(pl.col(eje).max(), pl.lit(1e-9))
+        return (pl.col(eje) / tope * bins).floor().clip(0, bins - 1).cast(pl.Int32).alias(f"bin_{eje}")
+
+    return ejes.select([
+        bin_de("x"), bin_de("y"),
+        pl.col("x").max().alias("max_x"), pl.col("y").max().alias("max_y")
+    ]).group_by(["bin_x", "bin_y"]).agg([
+        pl.len().alias("REGISTROS"),
+        pl.col("max_x").first(),
+        pl.col("max_y").first()
+    ])
+
+
+def muestra_estratificada(lf, presupuesto, minimo_por_tecnologia=50):
+    """Muestra de hasta ~`presupuesto` filas repartida por TECNOLOGIA según su peso.
+
+    Cada tecnología recibe al menos `minimo_por_tecnologia` puntos (o todas sus filas)
+    para que las minoritarias no desaparezcan del gráfico.
+    """
+    filas_tecno = pl.len().over("TECNOLOGIA")
+    cupo = pl.max_horizontal(
+        (filas_tecno / pl.len() * presupuesto).ceil(),
+        pl.lit(minimo_por_tecnologia)
+    )
+    return lf.select(
+        ["VELOCIDAD_EFECTIVA_DOWNSTREAM", "VELOCIDAD_EFECTIVA_UPSTREAM", "TECNOLOGIA"]
+    ).filter(
+        pl.int_range(pl.len()).shuffle(seed=1).over("TECNOLOGIA") < cupo
+    ).with_columns(pl.col("TECNOLOGIA").cast(pl.String))
+
+
+def consultar_tabla(tabla, busqueda="", orden=None, descendente=False):
+    """Búsqueda (sin distinguir mayúsculas, en las columnas de texto) y orden de una tabla agregada."""
+    lf = tabla.lazy()
+    texto = busqueda.strip().lower()
+    if texto:
+        lf = lf.filter(pl.any_horizontal(
+            cs.string().str.to_lowercase().str.contains(texto, literal=True)
+        ))
+    if orden:
+        lf = lf.sort(orden, descending=descendente, nulls_last=True)
+    return lf
+
+
+def exportar_tabla(consulta, formato):
+    """Bytes CSV o Parquet de la consulta completa, escritos por el motor de streaming."""
+    buffer = io.BytesIO()
+    if formato == "parquet":
+        consulta.sink_parquet(buffer)
+    else:
+        consulta.sink_csv(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,191 @@
+"""Bocetos (sketches) combinables por celda (PERIODO, DEPARTAMENTO, EMPRESA) para el modo aproximado.
+
+Los KPIs y los top-N del tablero re-agregan el cubo filtrado completo, cuyo tamaño crece
+con los datos. En modo aproximado salen de tablas mucho menores, precalculadas una vez
+por celda y combinadas al consultar:
+
+    celdas      sumas y conteos exactos de la celda (totales y promedios exactos)
+    hll         registros HyperLogLog de MUNICIPIO en forma dispersa (celda, registro, rho):
+                combinar celdas es el máximo por registro
+    frecuentes  los K municipios más pesados de la celda por registros y por ingresos, con
+                el mayor valor descartado como cota: una lista de heavy hitters combinable
+
+Solo aplican cuando los filtros se expresan con la celda (años, departamentos y empresas,
+sin rangos financieros); con otros filtros el tablero sigue usando el cubo.
+"""
+import math
+
+import polars as pl
+import polars.selectors as cs
+
+from .agregados import promedio
+
+GRANO_BOCETOS = ["ANNO", "PERIODO", "DEPARTAMENTO", "EMPRESA"]
+PRECISION_HLL = 10  # 2^10 registros: error estándar ~1.04 / sqrt(1024) ≈ 3 %
+MUNICIPIOS_POR_CELDA = 20  # K de las listas de frecuentes
+
+MEDIDAS_CELDA = [
+    "REGISTROS", "VALOR_FACTURADO_O_COBRADO", "OTROS_VALORES_FACTURADOS", "VALOR_TOTAL",
+    "CANTIDAD_LINEAS_ACCESOS", "SUMA_VELOCIDAD_EFECTIVA_DOWNSTREAM", "N_VELOCIDAD_EFECTIVA_DOWNSTREAM",
+    "SUMA_VELOCIDAD_EFECTIVA_UPSTREAM", "N_VELOCIDAD_EFECTIVA_UPSTREAM"
+]
+
+# Tablas de cada pestaña que el modo aproximado resuelve con bocetos, y cuáles de ellas
+# son aproximadas (el resto sale exacto de las celdas)
+TABLAS_BOCETOS = {
+    "general": ("kpis", "muni_data"),
+    "financiero": ("kpis",),
+    "tendencias": ("heat_data",),
+    "conectividad": ("kpis",),
+    "geografico": ("top_munis",)
+}
+TABLAS_APROXIMADAS = {"kpis": ("MUNICIPIO",), "muni_data": ("len",), "top_munis": ("VALOR_TOTAL",)}
+
+
+def aplicable(filtros):
+    """True si los filtros solo restringen dimensiones de la celda."""
+    return filtros.rangos_completos and not (filtros.municipios or filtros.paquetes or filtros.tecnologias)
+
+
+def registros_hll(lf, columna, por, precision=PRECISION_HLL):
+    """HyperLogLog disperso de `columna` por grupo: (por..., REGISTRO, RHO) con el máximo rho.
+
+    Los `precision` bits altos del hash eligen el registro; rho es la posición del primer
+    bit en 1 del resto. El hash de Polars es estable dentro de una versión de Polars, que
+    es donde se construyen y consultan los bocetos.
+    """
+    resto = 2 ** (64 - precision)
+    h = pl.col(columna).cast(pl.String).hash(seed=0)
+    return lf.select(por + [
+        (h // resto).cast(pl.UInt16).alias("REGISTRO"),
+        ((h % resto).bitwise_leading_zeros() - precision + 1).cast(pl.UInt8).alias("RHO")
+    ]).group_by(por + ["REGISTRO"]).agg(pl.col("RHO").max())
+
+
+def estimar_hll(registros, precision=PRECISION_HLL):
+    """Cardinalidad estimada a partir de las filas (REGISTRO, RHO) de uno o varios grupos."""
+    m = 2 ** precision
+    combinados = registros.group_by("REGISTRO").agg(pl.col("RHO").max())
+    vacios = m - combinados.height
+    suma = combinados.select((2.0 ** -pl.col("RHO").cast(pl.Float64)).sum()).item() + vacios
+
+    estimacion = 0.7213 / (1 + 1.079 / m) * m * m / suma
+    if estimacion <= 2.5 * m and vacios > 0:
+        estimacion = m * math.log(m / vacios)  # Conteo lineal: más preciso con pocos valores
+    return estimacion
+
+
+def frecuentes(cubo, k=MUNICIPIOS_POR_CELDA):
+    """Por celda, los municipios en el top-k por registros o por ingresos, más la cota de error.
+
+    COTA_* es el mayor valor entre los municipios descartados de la celda: un municipio
+    ausente de la lista aporta como mucho eso a cualquier combinación de celdas.
+    """
+    por_municipio = cubo.group_by(GRANO_BOCETOS + ["MUNICIPIO"]).agg(
+        pl.col("REGISTROS").sum(), pl.col("VALOR_TOTAL").sum()
+    ).with_columns(
+        pl.col("REGISTROS").rank("ordinal", descending=True).over(GRANO_BOCETOS).alias("_POS_REGISTROS"),
+        pl.col("VALOR_TOTAL").rank("ordinal", descending=True).over(GRANO_BOCETOS).alias("_POS_VALOR")
+    )
+    en_lista = (pl.col("_POS_REGISTROS") <= k) | (pl.col("_POS_VALOR") <= k)
+
+    cotas = por_municipio.group_by(GRANO_BOCETOS).agg(
+        pl.col("REGISTROS").filter(pl.col("_POS_REGISTROS") > k).max().fill_null(0).alias("COTA_REGISTROS"),
+        pl.col("VALOR_TOTAL").filter(pl.col("_POS_VALOR") > k).max().fill_null(0).alias("COTA_VALOR_TOTAL")
+    )
+    return por_municipio.filter(en_lista).drop("_POS_REGISTROS", "_POS_VALOR"), cotas
+
+
+class Bocetos:
+    """Tablas de bocetos de un cubo. Se construyen una vez por versión de los datos."""
+
+    TABLAS = ("celdas", "hll", "frecuentes", "cotas")
+
+    def __init__(self, celdas, hll, frecuentes, cotas):
+        self.celdas = celdas
+        self.hll = hll
+        self.frecuentes = frecuentes
+        self.cotas = cotas
+
+    @classmethod
+    def desde_cubo(cls, cubo):
+        lf = cubo.lazy()
+        celdas = lf.group_by(GRANO_BOCETOS).agg([pl.col(c).sum() for c in MEDIDAS_CELDA])
+        hll = registros_hll(lf, "MUNICIPIO", GRANO_BOCETOS)
+        lista, cotas = frecuentes(lf)
+        return cls(*pl.collect_all([celdas, hll, lista, cotas]))
+
+    def combinar(self, otros):
+        """Bocetos de la unión de los cubos de `self` y `otros` (con los mismos dominios).
+
+        Celdas y cotas se suman y cada registro HLL toma el mayor rho. Las listas de
+        frecuentes se unen sumando lo que vio cada lado: a un municipio ausente de la lista
+        de un lado le falta como mucho la cota de ese lado, que queda incluida en la suma.
+        """
+        def unir(tabla, claves, agregado):
+            return pl.concat([getattr(self, tabla), getattr(otros, tabla)]).group_by(claves).agg(agregado)
+
+        return Bocetos(
+            unir("celdas", GRANO_BOCETOS, pl.all().sum()),
+            unir("hll", GRANO_BOCETOS + ["REGISTRO"], pl.col("RHO").max()),
+            unir("frecuentes", GRANO_BOCETOS + ["MUNICIPIO"], pl.all().sum()),
+            unir("cotas", GRANO_BOCETOS, pl.all().sum())
+        )
+
+    def tablas_por_nombre(self):
+        return {nombre: getattr(self, nombre) for nombre in self.TABLAS}
+
+    def tamano_mb(self):
+        """Memoria estimada de las cuatro tablas (la muestra el panel de perfil)."""
+        return sum(t.estimated_size("mb") for t in self.tablas_por_nombre().values())
+
+    def tablas(self, filtros, pestana):
+        """Las tablas de TABLAS_BOCETOS[pestana] con los mismos nombres y columnas que las exactas."""
+        predicado = filtros.predicado()
+        celdas = self.celdas.filter(predicado)
+        calcular = {
+            "kpis": lambda: self.kpis(celdas, predicado),
+            "muni_data": lambda: self.top_municipios(predicado, "REGISTROS", 10).rename({"REGISTROS": "len"}),
+            "top_munis": lambda: self.top_municipios(predicado, "VALOR_TOTAL", 10),
+            "heat_data": lambda: self.mapa_calor(celdas)
+        }
+        return {
+            nombre: calcular[nombre]().with_columns(cs.enum().cast(pl.String))
+            for nombre in TABLAS_BOCETOS.get(pestana, ())
+        }
+
+    def kpis(self, celdas, predicado):
+        # Departamentos y empresas son claves de la celda: su conteo es exacto
+        return celdas.select(
+            pl.col("REGISTROS").sum(),
+            pl.col("DEPARTAMENTO").n_unique(),
+            pl.lit(round(estimar_hll(self.hll.filter(predicado)))).cast(pl.UInt32).alias("MUNICIPIO"),
+            pl.col("EMPRESA").n_unique(),
+            pl.col("VALOR_FACTURADO_O_COBRADO").sum(),
+            pl.col("OTROS_VALORES_FACTURADOS").sum(),
+            pl.col("VALOR_TOTAL").sum(),
+            pl.col("CANTIDAD_LINEAS_ACCESOS").sum(),
+            promedio("VELOCIDAD_EFECTIVA_DOWNSTREAM"),
+            promedio("VELOCIDAD_EFECTIVA_UPSTREAM")
+        )
+
+    def top_municipios(self, predicado, medida, n):
+        """Top-n municipios por `medida` combinando las listas de las celdas.
+
+        El valor es una cota inferior (suma de las celdas donde el municipio está en la
+        lista); COTA_ERROR es lo máximo que le puede faltar: la suma de las cotas de las
+        celdas filtradas.
+        """
+        cota = self.cotas.filter(predicado).select(pl.col(f"COTA_{medida}").sum()).item()
+        return (
+            self.frecuentes.filter(predicado)
+            .group_by("MUNICIPIO").agg(pl.col(medida).sum())
+            .sort(medida, descending=True).head(n)
+            .with_columns(pl.lit(cota).alias("COTA_ERROR"))
+        )
+
+    def mapa_calor(self, celdas):
+        """Registros por PERIODO de las 5 empresas con más registros (exacto: EMPRESA es clave)."""
+        por_empresa = celdas.group_by(["PERIODO", "EMPRESA"]).agg(pl.col("REGISTROS").sum().alias("len"))
+        top = por_empresa.group_by("EMPRESA").agg(pl.col("len").sum()).sort("len", descending=True).head(5)
+        return por_empresa.join(top.select("EMPRESA"), on="EMPRESA", how="semi").sort("PERIODO")
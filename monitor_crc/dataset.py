@@ -0,0 +1,405 @@
+"""Datos cargados del tablero: `Dataset` por versión y `CatalogoDatos` con el manifiesto de archivos."""
+import logging
+import threading
+from collections import OrderedDict
+
+import polars as pl
+
+from .agregados import combinar_cubos, construir_cubo
+from .bocetos import Bocetos
+from .distribuciones import combinar_histogramas, construir_histogramas
+from .filtros import PREDICADO_BASE
+from .ingesta import (
+    DIRECTORIO_ALMACEN, PATRON_CRUDOS, Fuente, aplicar_dominios, combinar_dominios, crear_fuente,
+    escanear, firmar_archivos, listar_archivos, shards_sin_ingerir
+)
+from .instantanea import abrir_cubo, abrir_instantanea, guardar_instantanea
+from .memoria import MOTOR_MEMORIA, elegir_motor, estimar_mb, materializar, techo_por_defecto
+
+registro = logging.getLogger(__name__)
+
+
+def listas_de_dominios(dominios):
+    """Listas de los selectores tomadas directamente de las categorías de los Enum."""
+    dominios = dict(dominios)
+    return {
+        'deptos': list(dominios['DEPARTAMENTO']),
+        'empresas': list(dominios['EMPRESA']),
+        'paquetes': list(dominios['SERVICIO_PAQUETE']),
+        'tecnologias': list(dominios['TECNOLOGIA'])
+    }
+
+
+def filas_base(fuente, predicado=None):
+    """Filas que ve el tablero con los sliders completos, restringidas además a `predicado`."""
+    return escanear(fuente, PREDICADO_BASE if predicado is None else PREDICADO_BASE & predicado)
+
+
+def extraer_opciones(fuente, motor=MOTOR_MEMORIA):
+    # 1. Escaneamos los archivos sin materializarlos
+    lf = escanear(fuente)
+
+    # 2. Solo años y máximos financieros requieren leer datos; las dimensiones salen de los Enum
+    resumen = lf.select([
+        pl.col("ANNO").unique().sort().implode().alias('anos'),
+        pl.col("VALOR_FACTURADO_O_COBRADO").max().alias('max_val_facturado'),
+        pl.col("OTROS_VALORES_FACTURADOS").max().alias('max_otros')
+    ])
+
+    # 3. Jerarquía Departamento -> (DIVIPOLA, municipios, operadores), en la misma pasada
+    jerarquia = lf.group_by("DEPARTAMENTO").agg([
+        pl.col("ID_DEPTO_MAPA").first().alias("divipola"),
+        pl.col("MUNICIPIO").unique().sort().cast(pl.String).alias("municipios"),
+        pl.col("EMPRESA").unique().sort().cast(pl.String).alias("empresas")
+    ])
+
+    resumen, jerarquia = pl.collect_all([resumen, jerarquia], engine=motor)
+
+    opciones = resumen.row(0, named=True)
+    opciones.update(listas_de_dominios(fuente.dominios))
+    opciones['jerarquia'] = {
+        fila.pop("DEPARTAMENTO"): fila for fila in jerarquia.iter_rows(named=True)
+    }
+    return opciones
+
+
+def combinar_opciones(previas, nuevas, dominios):
+    """Opciones de la fuente ampliada sin releer los archivos ya ingeridos."""
+    jerarquia = {depto: dict(info) for depto, info in previas['jerarquia'].items()}
+    for depto, info in nuevas['jerarquia'].items():
+        if depto not in jerarquia:
+            jerarquia[depto] = info
+            continue
+        actual = jerarquia[depto]
+        actual['municipios'] = sorted(set(actual['municipios']) | set(info['municipios']))
+        actual['empresas'] = sorted(set(actual['empresas']) | set(info['empresas']))
+
+    def maximo(clave):
+        return max((v for v in (previas[clave], nuevas[clave]) if v is not None), default=None)
+
+    opciones = {
+        'anos': sorted(set(previas['anos']) | set(nuevas['anos'])),
+        'max_val_facturado': maximo('max_val_facturado'),
+        'max_otros': maximo('max_otros'),
+        'jerarquia': jerarquia
+    }
+    opciones.update(listas_de_dominios(dominios))
+    return opciones
+
+
+class Dataset:
+    """Una versión de los datos: fuente escaneable, opciones de los filtros y cubo precalculado.
+
+    Es inmutable en la práctica: las actualizaciones crean un Dataset nuevo, así que una
+    sesión que ya lo tiene siempre lee un estado coherente.
+    """
+
+    def __init__(self, fuente, opciones, cubo, version=0, ruta_cubo=None, motor=MOTOR_MEMORIA,
+                 histogramas=None, bocetos=None):
+        self.fuente = fuente
+        self.opciones = opciones
+        self.cubo = cubo
+        self.version = version
+        # Archivo IPC del que está mapeado el cubo (ver instantanea), si lo hay
+        self.ruta_cubo = ruta_cubo
+        # Motor de Polars de las consultas: MOTOR_STREAMING si los datos superan el techo (ver memoria)
+        self.motor = motor
+        # Derivados que se construyen la primera vez que se piden, salvo que ya vengan hechos
+        self._bocetos = bocetos
+        self._histogramas = histogramas
+        self._lock_derivados = threading.Lock()
+
+    @classmethod
+    def cargar(cls, archivos, almacen, version=0, motor=MOTOR_MEMORIA):
+        fuente = crear_fuente(archivos, almacen, motor)
+        opciones = extraer_opciones(fuente, motor)
+        cubo = materializar(lambda p: construir_cubo(filas_base(fuente, p)), opciones['anos'], motor)
+        return cls(fuente, opciones, cubo, version, motor=motor)
+
+    @classmethod
+    def abrir(cls, patron_crudos=PATRON_CRUDOS, directorio_almacen=DIRECTORIO_ALMACEN, techo_mb=None):
+        """El almacén compactado si existe; si no, los shards crudos del patrón.
+
+        En modo streaming si las filas estimadas superan `techo_mb` (por defecto, ver
+        `memoria.techo_por_defecto`).
+        """
+        archivos, almacen = listar_archivos(patron_crudos, directorio_almacen)
+        if not archivos:
+            raise FileNotFoundError(f"No se encontraron archivos con el patrón: {patron_crudos}")
+        techo_mb = techo_por_defecto() if techo_mb is None else techo_mb
+        return cls.cargar(archivos, almacen, motor=elegir_motor(estimar_mb(archivos), techo_mb))
+
+    def ampliar(self, nuevos, version, motor=None):
+        """Dataset con shards crudos adicionales, sin releer los ya ingeridos.
+
+        Los histogramas y los bocetos ya construidos se combinan con los de los shards
+        nuevos; los que aún no se pidieron se construyen completos cuando se pidan.
+        """
+        motor = motor or self.motor
+        # Los dominios crecen con los valores nuevos; cubo y derivados previos solo se re-tipan
+        dominios = combinar_dominios(self.fuente.dominios, crear_fuente(nuevos, False, motor).dominios)
+        parcial = Fuente(tuple(nuevos), False, dominios)
+        opciones_nuevas = extraer_opciones(parcial, motor)
+        opciones = combinar_opciones(self.opciones, opciones_nuevas, dominios)
+        cubo_nuevo = materializar(lambda p: construir_cubo(filas_base(parcial, p)), opciones_nuevas['anos'], motor)
+
+        def cubo_de(predicado):
+            previo = aplicar_dominios(self.cubo.lazy(), dominios)
+            nuevo = cubo_nuevo.lazy()
+            if predicado is not None:
+                previo, nuevo = previo.filter(predicado), nuevo.filter(predicado)
+            return combinar_cubos([previo, nuevo])
+
+        cubo = materializar(cubo_de, opciones['anos'], motor)
+
+        histogramas = self._histogramas
+        if histogramas is not None:
+            histogramas = combinar_histogramas([
+                aplicar_dominios(histogramas, dominios),
+                materializar(lambda p: construir_histogramas(filas_base(parcial, p)), opciones_nuevas['anos'], motor)
+            ])
+
+        bocetos = self._bocetos
+        if bocetos is not None:
+            bocetos = Bocetos(**{
+                nombre: aplicar_dominios(tabla, dominios) for nombre, tabla in bocetos.tablas_por_nombre().items()
+            }).combinar(Bocetos.desde_cubo(cubo_nuevo))
+
+        fuente = Fuente(self.fuente.archivos + parcial.archivos, False, dominios)
+        return Dataset(fuente, opciones, cubo, version, motor=motor, histogramas=histogramas, bocetos=bocetos)
+
+    @property
+    def bocetos(self):
+        """Bocetos del modo aproximado; se construyen desde el cubo la primera vez que se piden."""
+        if self._bocetos is None:
+            with self._lock_derivados:
+                if self._bocetos is None:
+                    self._bocetos = Bocetos.desde_cubo(self.cubo)
+        return self._bocetos
+
+    @property
+    def histogramas(self):
+        """Histogramas log de velocidad por celda (ver distribuciones); una pasada por las filas la primera vez."""
+        if self._histogramas is None:
+            with self._lock_derivados:
+                if self._histogramas is None:
+                    self._histogramas = materializar(
+                        lambda p: construir_histogramas(filas_base(self.fuente, p)),
+                        self.opciones.get('anos'), self.motor
+                    )
+        return self._histogramas
+
+    def derivados(self):
+        """(histogramas, bocetos) ya construidos, None los que aún no se pidieron; no construye nada."""
+        return self._histogramas, self._bocetos
+
+    def filas(self, filtros):
+        """Filas crudas (LazyFrame) que cumplen todos los filtros, rangos financieros incluidos."""
+        return escanear(self.fuente, filtros.predicado_filas())
+
+    def filtrar(self, filtros):
+        """Cubo filtrado (LazyFrame) listo para re-agregar.
+
+        Con los sliders en su rango completo se filtra el cubo precalculado; si no, el
+        cubo se arma al vuelo sobre las filas crudas, las únicas donde se pueden evaluar
+        los rangos financieros.
+        """
+        if filtros.rangos_completos:
+            return self.cubo.lazy().filter(filtros.predicado())
+        return construir_cubo(self.filas(filtros))
+
+
+class FiltradoIncremental:
+    """Vista de un Dataset para una sesión que reutiliza su último cubo filtrado.
+
+    Las sesiones de exploración suelen estrechar los filtros paso a paso. Si el estado
+    nuevo refina el anterior (ver `Filtros.refina`), se filtra el cubo ya filtrado en lugar
+    del completo o, con rangos financieros, en lugar de re-agregar las filas crudas; si lo
+    amplía, se vuelve al Dataset. Expone `filtrar` y `filas` como Dataset, así que las
+    funciones de `metricas` la aceptan tal cual.
+    """
+
+    def __init__(self, dataset, fraccion_maxima=0.5):
+        self.dataset = dataset
+        self.version = dataset.version
+        # Sin rangos financieros, un cubo filtrado mayor que esta fracción del completo no se
+        # guarda: refinar sobre él cuesta casi lo mismo que sobre el completo y duplicaría su
+        # memoria. Con rangos se guarda siempre, porque la alternativa es releer las filas
+        self.fraccion_maxima = fraccion_maxima
+        self.filtros = None
+        self.cubo = None
+        self.refinados = 0
+        self.completos = 0
+
+    @property
+    def motor(self):
+        return self.dataset.motor
+
+    @property
+    def bocetos(self):
+        return self.dataset.bocetos
+
+    @property
+    def histogramas(self):
+        return self.dataset.histogramas
+
+    def filas(self, filtros):
+        return self.dataset.filas(filtros)
+
+    def filtrar(self, filtros):
+        if self.cubo is not None and filtros == self.filtros:
+            return self.cubo.lazy()
+
+        if self.cubo is not None and filtros.refina(self.filtros):
+            cubo = self.cubo.lazy().filter(filtros.predicado()).collect(engine=self.motor)
+            self.refinados += 1
+        else:
+            cubo = self.dataset.filtrar(filtros).collect(engine=self.motor)
+            self.completos += 1
+
+        guardar = not filtros.rangos_completos or cubo.height <= self.fraccion_maxima * self.dataset.cubo.height
+        self.filtros, self.cubo = (filtros, cubo) if guardar else (None, None)
+        return cubo.lazy()
+
+
+class CacheResultados:
+    """Caché LRU acotada de agregados, compartida por todas las sesiones del servidor.
+
+    La clave combina la versión de los datos con el hash canónico de los filtros (ver
+    `Filtros.clave`) y la consulta; el valor es lo que devuelve la función de métricas.
+    """
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self.entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.lock = threading.Lock()
+
+    def obtener(self, clave, calcular):
+        with self.lock:
+            if clave in self.entradas:
+                self.entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self.entradas[clave]
+            self.fallos += 1
+
+        # Se calcula fuera del lock para no bloquear a las demás sesiones
+        valor = calcular()
+
+        with self.lock:
+            self.entradas[clave] = valor
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.capacidad:
+                self.entradas.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self.lock:
+            self.entradas.clear()
+
+
+class CatalogoDatos:
+    """Dataset vigente del proceso con un manifiesto de los archivos ingeridos.
+
+    En cada rerun `actualizar` compara el manifiesto (ruta, bytes, mtime) con el disco.
+    Si solo aparecieron shards nuevos, se agregan al cubo, las opciones y la jerarquía sin
+    releer los anteriores; si alguno cambió o desapareció, se recarga todo.
+
+    Con el almacén compactado los shards crudos no se leen: los que aparezcan después de
+    la ingesta quedan en `sin_ingerir` hasta que se vuelva a ejecutar `monitor_crc.ingesta`.
+
+    Con `directorio_instantanea`, cada versión cargada se guarda como instantánea y una
+    recarga completa (el arranque incluido) la reutiliza si el manifiesto coincide.
+
+    Cada versión estima el tamaño de sus filas y, si supera `techo_mb` (por defecto, ver
+    `memoria.techo_por_defecto`), el Dataset se carga y consulta en modo streaming.
+    """
+
+    def __init__(self, patron_archivos, directorio_almacen, capacidad_cache, directorio_instantanea=None,
+                 techo_mb=None):
+        self.patron_archivos = patron_archivos
+        self.directorio_almacen = directorio_almacen
+        self.directorio_instantanea = directorio_instantanea
+        self.techo_mb = techo_por_defecto() if techo_mb is None else techo_mb
+        self.estimado_mb = None
+        self.sin_ingerir = []
+        self.manifiesto = {}
+        self.version = 0
+        # Se reemplaza entero en cada actualización (ver Dataset)
+        self.dataset = None
+        self.cache_resultados = CacheResultados(capacidad_cache)
+        self.lock = threading.Lock()
+
+    def actualizar(self):
+        archivos, almacen = listar_archivos(self.patron_archivos, self.directorio_almacen)
+        sin_ingerir = shards_sin_ingerir(self.patron_archivos, self.directorio_almacen) if almacen else []
+        if sin_ingerir and sin_ingerir != self.sin_ingerir:
+            registro.warning(
+                "%d shards no están en el almacén %s (%s); vuelve a ejecutar la ingesta para incluirlos",
+                len(sin_ingerir), self.directorio_almacen, ", ".join(sin_ingerir)
+            )
+        self.sin_ingerir = sin_ingerir
+        firmas = firmar_archivos(archivos)
+        if firmas == self.manifiesto:
+            return self.dataset
+
+        with self.lock:
+            if firmas == self.manifiesto:
+                return self.dataset  # Otra sesión ya hizo la actualización
+
+            previos = self.manifiesto
+            nuevos = [a for a in archivos if a not in previos]
+            solo_agregados = (
+                self.dataset is not None and not almacen and not self.dataset.fuente.almacen and
+                all(firmas.get(a) == firma for a, firma in previos.items())
+            )
+
+            version = self.version + 1
+            if not archivos:
+                dataset = None
+            else:
+                self.estimado_mb = estimar_mb(archivos)
+                motor = elegir_motor(self.estimado_mb, self.techo_mb)
+                dataset = None if solo_agregados else self.desde_instantanea(firmas, version, motor)
+                if dataset is None:
+                    if solo_agregados:
+                        dataset = self.dataset.ampliar(nuevos, version, motor)
+                    else:
+                        dataset = Dataset.cargar(archivos, almacen, version, motor)
+                    dataset = self.con_instantanea(dataset, firmas)
+
+            self.manifiesto = firmas
+            self.version = version
+            self.dataset = dataset
+            self.cache_resultados.limpiar()
+            return self.dataset
+
+    def desde_instantanea(self, firmas, version, motor=MOTOR_MEMORIA):
+        """Dataset de la instantánea guardada para este manifiesto, o None si no la hay."""
+        if self.directorio_instantanea is None:
+            return None
+        guardada = abrir_instantanea(firmas, self.directorio_instantanea)
+        if guardada is None:
+            return None
+        fuente, opciones, cubo, ruta_cubo, histogramas, bocetos = guardada
+        return Dataset(fuente, opciones, cubo, version, ruta_cubo, motor, histogramas, bocetos)
+
+    def con_instantanea(self, dataset, firmas):
+        """Guarda la instantánea y devuelve el dataset con el cubo mapeado desde ella.
+
+        Así el proceso que cargó tampoco conserva una copia propia del cubo en el heap. Los
+        histogramas y bocetos ya construidos se guardan con el cubo y pasan tal cual.
+        """
+        if self.directorio_instantanea is None:
+            return dataset
+        try:
+            ruta_cubo = guardar_instantanea(dataset, firmas, self.directorio_instantanea)
+        except OSError as e:
+            registro.warning("No se pudo guardar la instantánea en %s: %s", self.directorio_instantanea, e)
+            return dataset
+        histogramas, bocetos = dataset.derivados()
+        return Dataset(
+            dataset.fuente, dataset.opciones, abrir_cubo(ruta_cubo), dataset.version, ruta_cubo, dataset.motor,
+            histogramas=histogramas, bocetos=bocetos
+        )
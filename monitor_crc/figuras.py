@@ -0,0 +1,82 @@
+"""Caché de figuras de Plotly por contenido de las tablas que grafican.
+
+Con los agregados ya en caché, lo que más pesa en un rerun es volver a armar cada figura
+con `px.*`: validar trazas, armar la leyenda y, en los mapas, recortar y embeber el
+GeoJSON. La figura depende solo de las tablas que recibe y de la especificación del
+gráfico, así que se guarda ya construida con la clave (nombre del gráfico, huella de sus
+tablas) y un rerun con las mismas tablas la reusa sin pasar por `px.*` ni validar.
+
+En un acierto solo queda lo que hace `st.plotly_chart` con cualquier figura: `to_dict`
+(una copia) y `to_json`, unos 11 ms en un mapa con GeoJSON de ~65 KB y 2-3 ms en una
+barra de 10 filas. Las figuras guardadas no se modifican: Streamlit solo las copia.
+
+La huella es del contenido, no de los filtros: filtros distintos con el mismo resultado
+(o pestañas que grafican la misma tabla) comparten la entrada.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+import polars as pl
+
+
+def huella(*valores):
+    """Hash del contenido de las tablas (esquema y filas, en orden) y de los demás valores."""
+    h = hashlib.sha256()
+    for valor in valores:
+        if isinstance(valor, pl.DataFrame):
+            h.update(repr(valor.schema).encode())
+            h.update(valor.hash_rows(seed=0).to_numpy().tobytes())
+        else:
+            h.update(repr(valor).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class CacheFiguras:
+    """Caché LRU de figuras acotada por tamaño, compartida por las sesiones.
+
+    Cada figura cuenta contra la capacidad con la longitud de su JSON, lo que Streamlit
+    envía al navegador, medida una vez al guardarla. Una figura mayor que la capacidad
+    no se guarda.
+    """
+
+    def __init__(self, capacidad_mb):
+        self.capacidad = int(capacidad_mb * 1024 * 1024)
+        self.entradas = OrderedDict()  # clave -> (figura, bytes)
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.lock = threading.Lock()
+
+    @property
+    def memoria_mb(self):
+        return self.bytes / (1024 * 1024)
+
+    def obtener(self, clave, construir):
+        with self.lock:
+            if clave in self.entradas:
+                self.entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self.entradas[clave][0]
+            self.fallos += 1
+
+        figura = construir()
+        tamano = len(pio.to_json(figura, validate=False))
+        if tamano > self.capacidad:
+            return figura
+
+        with self.lock:
+            if clave in self.entradas:  # Otra sesión la construyó mientras tanto
+                self.bytes -= self.entradas.pop(clave)[1]
+            self.entradas[clave] = (figura, tamano)
+            self.bytes += tamano
+            while self.bytes > self.capacidad:
+                self.bytes -= self.entradas.popitem(last=False)[1][1]
+        return figura
+
+    def limpiar(self):
+        with self.lock:
+            self.entradas.clear()
+            self.bytes = 0
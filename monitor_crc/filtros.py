@@ -0,0 +1,106 @@
+"""Estado de los filtros del sidebar y su traducción a predicados de Polars."""
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+import polars as pl
+
+# Filas que ve el tablero con los sliders en su rango completo: los sliders van de 0 al
+# máximo de los datos, así que solo quedan fuera los valores negativos
+PREDICADO_BASE = (
+    (pl.col("VALOR_FACTURADO_O_COBRADO").fill_null(0) >= 0) &
+    (pl.col("OTROS_VALORES_FACTURADOS").fill_null(0) >= 0)
+)
+
+Rango = Tuple[float, float]
+
+# Campos de selección múltiple (una tupla vacía es "todos")
+CAMPOS_SELECCION = ("anos", "departamentos", "municipios", "empresas", "paquetes", "tecnologias")
+
+
+@dataclass(frozen=True)
+class Filtros:
+    """Filtros del sidebar. Una tupla vacía no filtra; un rango en None es el slider completo.
+
+    Es inmutable y hashable, así que sirve directamente como parte de claves de caché.
+    """
+    anos: Tuple[int, ...] = ()
+    departamentos: Tuple[str, ...] = ()
+    municipios: Tuple[str, ...] = ()
+    empresas: Tuple[str, ...] = ()
+    paquetes: Tuple[str, ...] = ()
+    tecnologias: Tuple[str, ...] = ()
+    val_facturado: Optional[Rango] = None
+    otros_valores: Optional[Rango] = None
+
+    @classmethod
+    def desde_sidebar(cls, opciones, sel_ano, sel_depto, sel_muni, sel_empresa, sel_paquete, sel_tecno,
+                      val_facturado_range, otros_valores_range):
+        """Normaliza los valores de los widgets: selecciones ordenadas y sliders completos como None."""
+        def rango(valores, maximo):
+            valores = (float(valores[0]), float(valores[1]))
+            return None if valores == (0.0, float(maximo)) else valores
+
+        return cls(
+            anos=tuple(sorted(sel_ano)),
+            departamentos=tuple(sorted(sel_depto)),
+            municipios=tuple(sorted(sel_muni)),
+            empresas=tuple(sorted(sel_empresa)),
+            paquetes=tuple(sorted(sel_paquete)),
+            tecnologias=tuple(sorted(sel_tecno)),
+            val_facturado=rango(val_facturado_range, opciones['max_val_facturado']),
+            otros_valores=rango(otros_valores_range, opciones['max_otros'])
+        )
+
+    @property
+    def rangos_completos(self):
+        return self.val_facturado is None and self.otros_valores is None
+
+    def predicado(self):
+        """Filtros categóricos: expresión válida en filas crudas y en el cubo.
+
+        Sobre columnas Enum (cubo y almacén) Polars convierte la lista de valores a códigos
+        una sola vez al planificar, así que el filtro por fila es una comparación de enteros.
+        """
+        condiciones = [pl.lit(True)]
+
+        if self.anos: condiciones.append(pl.col("ANNO").is_in(self.anos))
+        if self.departamentos: condiciones.append(pl.col("DEPARTAMENTO").is_in(self.departamentos))
+        if self.municipios: condiciones.append(pl.col("MUNICIPIO").is_in(self.municipios))
+        if self.empresas: condiciones.append(pl.col("EMPRESA").is_in(self.empresas))
+        if self.paquetes: condiciones.append(pl.col("SERVICIO_PAQUETE").is_in(self.paquetes))
+        if self.tecnologias: condiciones.append(pl.col("TECNOLOGIA").is_in(self.tecnologias))
+
+        return pl.all_horizontal(condiciones)
+
+    def predicado_filas(self):
+        """Filtros categóricos y rangos financieros; los rangos solo se evalúan sobre filas crudas."""
+        # Los nulos financieros cuentan como 0, igual que tras la transformación del escaneo
+        condiciones = [self.predicado(), PREDICADO_BASE]
+        if self.val_facturado is not None:
+            condiciones.append(pl.col("VALOR_FACTURADO_O_COBRADO").fill_null(0).is_between(*self.val_facturado))
+        if self.otros_valores is not None:
+            condiciones.append(pl.col("OTROS_VALORES_FACTURADOS").fill_null(0).is_between(*self.otros_valores))
+        return pl.all_horizontal(condiciones)
+
+    def refina(self, previos):
+        """True si estos filtros solo estrechan `previos`: cada fila que pasa estos pasa aquellos.
+
+        Se exige que los rangos sean iguales, porque un cubo ya agregado no permite
+        evaluar rangos financieros nuevos; las selecciones pueden ser subconjuntos.
+        """
+        if (self.val_facturado, self.otros_valores) != (previos.val_facturado, previos.otros_valores):
+            return False
+        for campo in CAMPOS_SELECCION:
+            antes, ahora = getattr(previos, campo), getattr(self, campo)
+            if antes and not (ahora and set(ahora) <= set(antes)):
+                return False
+        return True
+
+    def clave(self):
+        """Hash canónico del estado: el orden de selección no cambia la clave."""
+        estado = asdict(self)
+        for campo in CAMPOS_SELECCION:
+            estado[campo] = sorted(estado[campo])
+        return hashlib.sha256(json.dumps(estado, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,388 @@
+"""Figuras de Plotly del tablero, compartidas por la app y los reportes en lote.
+
+Cada función recibe las tablas que devuelve `metricas` (DataFrames de Polars, que van
+directo a Plotly vía narwhals) y arma la figura, sin depender de Streamlit. La app las
+pasa por su caché de figuras; `generar_reportes.py` las escribe en páginas HTML.
+
+Todas aceptan `plantilla`, la plantilla de Plotly de esa figura; con None, la plantilla
+por defecto (`pio.templates.default`).
+"""
+import math
+
+import plotly.express as px
+import plotly.graph_objects as go
+import polars as pl
+from plotly.subplots import make_subplots
+
+
+def recortar_geojson(geojson, ids_deptos):
+    """Solo los departamentos presentes en el mapa viajan al navegador."""
+    ids = set(ids_deptos)
+    return {
+        "type": "FeatureCollection",
+        "features": [f for f in geojson["features"] if f["properties"].get("DPTO") in ids]
+    }
+
+
+# ==========================================
+# GENERAL
+# ==========================================
+
+def mapa_registros(map_data, geojson, plantilla=None):
+    fig = px.choropleth(
+        map_data, geojson=recortar_geojson(geojson, map_data['ID_DEPTO_MAPA']),
+        locations='ID_DEPTO_MAPA',
+        featureidkey='properties.DPTO', color='len',
+        color_continuous_scale="Viridis",
+        hover_name="DEPARTAMENTO",
+        labels={'len': 'Registros'},
+        template=plantilla
+    )
+    fig.update_geos(fitbounds="locations", visible=False)
+    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, height=450)
+    return fig
+
+
+def registros_departamento(map_data, plantilla=None):
+    """Los datos del mapa como barras, para donde no hay GeoJSON."""
+    fig = px.bar(map_data.sort("len", descending=True), x="DEPARTAMENTO", y="len",
+                 color="len", color_continuous_scale="Viridis", labels={"len": "Registros"},
+                 template=plantilla)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def top_municipios(muni_data, plantilla=None):
+    fig = px.bar(muni_data.sort("len"), x='len', y='MUNICIPIO', orientation='h',
+                 color='len', color_continuous_scale='Teal',
+                 labels={'len': 'Registros'}, template=plantilla)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def mix_servicios(serv_data, plantilla=None):
+    fig = px.pie(serv_data, values='len', names='SERVICIO_PAQUETE', hole=0.5, template=plantilla)
+    fig.update_layout(
+        height=400,
+        margin=dict(t=20, b=20, l=10, r=10),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5)
+    )
+    return fig
+
+
+def registros_segmento(seg_data, plantilla=None):
+    fig = px.bar(seg_data, x='len', y='SEGMENTO', orientation='h',
+                text_auto='.2s', color='len', color_continuous_scale='Blues', template=plantilla)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+# ==========================================
+# FINANCIERO
+# ==========================================
+
+def composicion_ingresos(kpis, plantilla=None):
+    fila = kpis.row(0, named=True)
+    comp_data = pl.DataFrame({
+        "Tipo": ["Valor Facturado", "Otros Valores"],
+        "Monto": [fila["VALOR_FACTURADO_O_COBRADO"], fila["OTROS_VALORES_FACTURADOS"]]
+    })
+    fig = px.pie(comp_data, values='Monto', names='Tipo', hole=0.4,
+                 color_discrete_sequence=['#1f77b4', '#ff7f0e'], template=plantilla)
+    return fig
+
+
+def valor_paquete(val_paq, plantilla=None):
+    fig = px.treemap(
+        val_paq,
+        path=['SERVICIO_PAQUETE'],
+        values='VALOR_TOTAL',
+        color='VALOR_TOTAL',
+        color_continuous_scale='Greens',
+        template=plantilla
+    )
+    fig.update_traces(textinfo="label+value")
+    return fig
+
+
+def valor_operador(val_op, plantilla=None):
+    fig = px.bar(
+        val_op,
+        x='EMPRESA',
+        y='VALOR_TOTAL',
+        color='VALOR_TOTAL',
+        color_continuous_scale='YlGnBu',
+        text_auto='.2s',
+        template=plantilla
+    )
+    fig.update_layout(yaxis_title="Total (COP)", xaxis_title=None, showlegend=False)
+    return fig
+
+
+def ingresos_tecnologia(val_tec, plantilla=None):
+    fig = px.bar(val_tec, x='TECNOLOGIA', y='VALOR_TOTAL',
+                color='VALOR_TOTAL', color_continuous_scale='Reds',
+                text_auto='.2s', template=plantilla)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+# ==========================================
+# TENDENCIAS
+# ==========================================
+
+def tendencia_principal(df_temp, plantilla=None):
+    fig = make_subplots(specs=[[{"secondary_y": True}]], figure=go.Figure(layout=dict(template=plantilla)))
+    fig.add_trace(
+        go.Scatter(x=df_temp['PERIODO'], y=df_temp['VALOR_TOTAL'],
+                  name="Facturación ($)", line=dict(color='green', width=3)),
+        secondary_y=False
+    )
+    fig.add_trace(
+        go.Bar(x=df_temp['PERIODO'], y=df_temp['REGISTROS'],
+              name="Registros", opacity=0.3, marker_color='lightblue'),
+        secondary_y=True
+    )
+    fig.update_layout(title="Evolución: Facturación vs Volumen", height=450)
+    return fig
+
+
+def tendencia_tecnologias(tec_trend, plantilla=None):
+    fig = px.area(tec_trend, x="PERIODO", y="len", color="TECNOLOGIA", groupnorm='percent', template=plantilla)
+    return fig
+
+
+def popularidad_paquetes(paq_trend, plantilla=None):
+    fig = px.line(paq_trend, x="PERIODO", y="len", color="SERVICIO_PAQUETE", markers=True, template=plantilla)
+    return fig
+
+
+def velocidad_periodo(vel_trend, plantilla=None):
+    fig = px.line(vel_trend, x="PERIODO", y="VELOCIDAD_EFECTIVA_DOWNSTREAM",
+                 markers=True, line_shape='spline', template=plantilla)
+    return fig
+
+
+def intensidad_operadores(heat_data, plantilla=None):
+    fig = px.density_heatmap(heat_data, x="PERIODO", y="EMPRESA", z="len",
+                             color_continuous_scale="YlOrRd", template=plantilla)
+    return fig
+
+
+# ==========================================
+# CONECTIVIDAD
+# ==========================================
+
+def lineas_tecnologia(lin_tec, plantilla=None):
+    fig = px.pie(lin_tec, values="CANTIDAD_LINEAS_ACCESOS", names="TECNOLOGIA", hole=0.4, template=plantilla)
+    return fig
+
+
+def lineas_segmento(lin_seg, plantilla=None):
+    fig = px.bar(lin_seg, x="SEGMENTO", y="CANTIDAD_LINEAS_ACCESOS",
+                color="CANTIDAD_LINEAS_ACCESOS", text_auto='.2s',
+                color_continuous_scale='Purples', template=plantilla)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def velocidad_departamento(vel_depto, plantilla=None):
+    fig = px.bar(vel_depto, x="VELOCIDAD_EFECTIVA_DOWNSTREAM", y="DEPARTAMENTO",
+                orientation='h', color='VELOCIDAD_EFECTIVA_DOWNSTREAM',
+                color_continuous_scale='Teal', template=plantilla)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def densidad_velocidades(hist, bins, plantilla=None):
+    """Heatmap Down x Up del histograma 2D de `metricas.densidad_velocidades`, en escala log."""
+    z = [[None] * bins for _ in range(bins)]
+    conteos = [[None] * bins for _ in range(bins)]
+    for bx, by, n in hist.select(["bin_x", "bin_y", "REGISTROS"]).iter_rows():
+        z[by][bx] = math.log10(n)
+        conteos[by][bx] = n
+
+    max_x = hist["max_x"].max() or 0.0
+    max_y = hist["max_y"].max() or 0.0
+    def centros(maximo):
+        return [10 ** ((i + 0.5) * maximo / bins) - 1 for i in range(bins)]
+
+    fig = go.Figure(go.Heatmap(
+        x=centros(max_x), y=centros(max_y), z=z, customdata=conteos,
+        colorscale="Viridis", colorbar=dict(title="log₁₀ reg."),
+        hovertemplate="Bajada: %{x:.1f} Mbps<br>Subida: %{y:.1f} Mbps<br>Registros: %{customdata:,}<extra></extra>"
+    ), layout=dict(template=plantilla))
+    fig.update_layout(
+        xaxis=dict(type="log", title="VELOCIDAD_EFECTIVA_DOWNSTREAM"),
+        yaxis=dict(type="log", title="VELOCIDAD_EFECTIVA_UPSTREAM")
+    )
+    return fig
+
+
+def muestra_velocidades(df_sample_vel, plantilla=None):
+    fig = px.scatter(df_sample_vel, x="VELOCIDAD_EFECTIVA_DOWNSTREAM",
+                     y="VELOCIDAD_EFECTIVA_UPSTREAM", color="TECNOLOGIA",
+                     opacity=0.6, render_mode="webgl", template=plantilla)
+    return fig
+
+
+def percentiles_periodo(por_periodo, plantilla=None):
+    fig = go.Figure([
+        go.Scatter(x=por_periodo["PERIODO"], y=por_periodo["P90"], name="p90",
+               line=dict(width=0), showlegend=False),
+        go.Scatter(x=por_periodo["PERIODO"], y=por_periodo["P10"], name="p10–p90",
+               line=dict(width=0), fill="tonexty", fillcolor="rgba(0,128,128,0.2)"),
+        go.Scatter(x=por_periodo["PERIODO"], y=por_periodo["P50"], name="Mediana",
+               line=dict(color="teal", width=3))
+    ], layout=dict(template=plantilla))
+    fig.update_layout(yaxis=dict(type="log", title="Mbps"), hovermode="x unified")
+    return fig
+
+
+def cdf_tecnologia(cdf_tec, plantilla=None):
+    fig = px.line(cdf_tec,
+                  x="MBPS", y="F", color="TECNOLOGIA", log_x=True,
+                  labels={"MBPS": "Mbps", "F": "Fracción de registros ≤"}, template=plantilla)
+    return fig
+
+
+# ==========================================
+# COMPETENCIA
+# ==========================================
+
+def share_ingresos(share_val, plantilla=None):
+    fig = px.pie(share_val, values="VALOR_TOTAL", names="EMPRESA", hole=0.5, template=plantilla)
+    return fig
+
+
+def share_volumen(share_vol, plantilla=None):
+    fig = px.pie(share_vol, values="len", names="EMPRESA", hole=0.5, template=plantilla)
+    return fig
+
+
+def operador_lider(dom_op, plantilla=None):
+    fig = px.bar(dom_op, x="DEPARTAMENTO", y="len", color="EMPRESA",
+                text='EMPRESA', template=plantilla)
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def mix_operadores(div_op, plantilla=None):
+    fig = px.bar(div_op, x="EMPRESA", y="len", color="TECNOLOGIA", text_auto=True, template=plantilla)
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+# ==========================================
+# SEGMENTACIÓN
+# ==========================================
+
+def distribucion_segmento(seg_dist, plantilla=None):
+    fig = px.bar(seg_dist, x='SEGMENTO', y='len',
+                color='len', color_continuous_scale='Blues',
+                text_auto='.2s', template=plantilla)
+    fig.update_layout(showlegend=False, xaxis_tickangle=-45)
+    return fig
+
+
+def ingresos_segmento(seg_val, plantilla=None):
+    fig = px.pie(seg_val, values='VALOR_TOTAL', names='SEGMENTO', template=plantilla)
+    return fig
+
+
+def tecnologia_segmento(seg_tec, plantilla=None):
+    fig = px.sunburst(
+        seg_tec,
+        path=['SEGMENTO', 'TECNOLOGIA'],
+        values='len',
+        color='len',
+        color_continuous_scale='RdBu',
+        template=plantilla
+    )
+    return fig
+
+
+def velocidad_segmento(seg_vel, plantilla=None):
+    fig = px.bar(
+        seg_vel,
+        x='SEGMENTO',
+        y='VELOCIDAD_EFECTIVA_DOWNSTREAM',
+        color='VELOCIDAD_EFECTIVA_DOWNSTREAM',
+        color_continuous_scale='Viridis',
+        text_auto='.1f',
+        template=plantilla
+    )
+    fig.update_layout(yaxis_title="Mbps", showlegend=False)
+    return fig
+
+
+# ==========================================
+# GEOGRÁFICO
+# ==========================================
+
+def mapa_ingresos(map_rev_data, geojson, plantilla=None):
+    fig = px.choropleth(
+        map_rev_data,
+        geojson=recortar_geojson(geojson, map_rev_data['ID_DEPTO_MAPA']),
+        locations='ID_DEPTO_MAPA',
+        featureidkey='properties.DPTO',
+        color='VALOR_TOTAL',
+        color_continuous_scale="Inferno",
+        hover_name="DEPARTAMENTO",
+        title="Ingresos Totales (COP)",
+        labels={'VALOR_TOTAL': 'Ingresos'},
+        template=plantilla
+    )
+    fig.update_geos(fitbounds="locations", visible=False)
+    fig.update_layout(
+        margin={"r":0,"t":30,"l":0,"b":0},
+        height=500,
+        coloraxis_colorbar=dict(title="COP")
+    )
+    return fig
+
+
+def ingresos_departamento(map_rev_data, plantilla=None):
+    """Los datos del mapa de ingresos como barras, para donde no hay GeoJSON."""
+    fig = px.bar(map_rev_data.sort("VALOR_TOTAL", descending=True), x="DEPARTAMENTO", y="VALOR_TOTAL",
+                 color="VALOR_TOTAL", color_continuous_scale="Inferno", labels={"VALOR_TOTAL": "Ingresos"},
+                 template=plantilla)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def top_municipios_ingresos(top_munis, plantilla=None):
+    fig = px.bar(top_munis.sort("VALOR_TOTAL"), x="VALOR_TOTAL", y="MUNICIPIO", orientation="h",
+                 labels={"VALOR_TOTAL": "Ingresos"}, template=plantilla)
+    return fig
+
+
+# Gráfico de cada tabla de `metricas` que se dibuja sola, con su título: lo que usan los
+# reportes en lote. Los mapas van como barras para no depender del GeoJSON
+POR_TABLA = {
+    "map_data": ("Registros por departamento", registros_departamento),
+    "muni_data": ("Top 10 municipios", top_municipios),
+    "serv_data": ("Mix de servicios", mix_servicios),
+    "seg_data": ("Registros por segmento", registros_segmento),
+    "val_paq": ("Valor total por paquete", valor_paquete),
+    "val_op": ("Top 10 operadores por valor total", valor_operador),
+    "val_tec": ("Ingresos por tecnología", ingresos_tecnologia),
+    "df_temp": ("Facturación y registros por periodo", tendencia_principal),
+    "tec_trend": ("Tecnologías (% de registros)", tendencia_tecnologias),
+    "paq_trend": ("Popularidad de paquetes", popularidad_paquetes),
+    "vel_trend": ("Velocidad de bajada promedio", velocidad_periodo),
+    "heat_data": ("Intensidad top 5 operadores", intensidad_operadores),
+    "lin_tec": ("Líneas por tecnología", lineas_tecnologia),
+    "lin_seg": ("Líneas por segmento", lineas_segmento),
+    "vel_depto": ("Top 10 departamentos por velocidad", velocidad_departamento),
+    "share_val": ("Market share (ingresos)", share_ingresos),
+    "share_vol": ("Market share (volumen)", share_volumen),
+    "dom_op": ("Operador líder por departamento", operador_lider),
+    "div_op": ("Mix tecnológico de los principales operadores", mix_operadores),
+    "seg_dist": ("Registros por segmento", distribucion_segmento),
+    "seg_val": ("Ingresos por segmento", ingresos_segmento),
+    "seg_tec": ("Tecnología por segmento", tecnologia_segmento),
+    "seg_vel": ("Velocidad promedio por segmento", velocidad_segmento),
+    "map_rev_data": ("Ingresos por departamento", ingresos_departamento),
+    "top_munis": ("Top 10 municipios por ingresos", top_municipios_ingresos)
+}
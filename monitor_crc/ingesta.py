@@ -0,0 +1,245 @@
+"""Ingesta de los shards data_part_*.parquet a un almacén Parquet compactado.
+
+El almacén queda particionado por ANNO/TRIMESTRE (estilo hive), ordenado por
+DEPARTAMENTO/MUNICIPIO/EMPRESA dentro de cada partición, con los tipos finales,
+las columnas derivadas y estadísticas min/max por row group. La app lo escanea
+tal cual, sin transformar nada en cada carga.
+
+Uso:
+    python -m monitor_crc.ingesta
+    python -m monitor_crc.ingesta --origen "./data_part_*.parquet" --destino ./datos_crc
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import polars as pl
+
+PATRON_CRUDOS = "./data_part_*.parquet"
+DIRECTORIO_ALMACEN = "./datos_crc"
+ARCHIVO_METADATOS = "_ingesta.json"
+
+ESQUEMA_PARTICION = {"ANNO": pl.Int16, "TRIMESTRE": pl.Int8}
+
+# Dimensiones con dominio fijo: se guardan como pl.Enum y los filtros comparan códigos
+DIMENSIONES_ENUM = [
+    "DEPARTAMENTO", "MUNICIPIO", "EMPRESA", "SEGMENTO", "SERVICIO_PAQUETE", "TECNOLOGIA", "PERIODO"
+]
+PERIODO = pl.format("{}-T{}", pl.col("ANNO"), pl.col("TRIMESTRE"))
+ORDEN_ALMACEN = ["DEPARTAMENTO", "MUNICIPIO", "EMPRESA"]
+FILAS_POR_ROW_GROUP = 100_000
+
+# Origen de datos del tablero: shards crudos o almacén compactado, con el dominio de
+# cada dimensión como tupla (columna, categorías) para que sea hashable en st.cache_*
+Fuente = namedtuple("Fuente", ["archivos", "almacen", "dominios"])
+
+
+def calcular_dominios(crudos, motor="auto"):
+    """Valores distintos (ordenados) de cada dimensión Enum, en una sola pasada sobre los crudos."""
+    columnas = {c: pl.col(c).cast(pl.String) for c in DIMENSIONES_ENUM if c != "PERIODO"}
+    columnas["PERIODO"] = PERIODO
+
+    fila = crudos.select([
+        expr.drop_nulls().unique().sort().implode().alias(c) for c, expr in columnas.items()
+    ]).collect(engine=motor).row(0, named=True)
+
+    return tuple((c, tuple(fila[c])) for c in DIMENSIONES_ENUM)
+
+
+def dominios_de_esquema(esquema):
+    """Dominios leídos del esquema del almacén, donde las dimensiones ya son Enum."""
+    return tuple((c, tuple(esquema[c].categories.to_list())) for c in DIMENSIONES_ENUM)
+
+
+def transformar(lf, dominios):
+    """Tipos finales y columnas derivadas sobre las columnas crudas de los shards."""
+    enums = {c: pl.Enum(categorias) for c, categorias in dominios}
+
+    # Seleccionamos SOLO lo necesario y optimizamos tipos
+    # Las dimensiones pasan a Enum: enteros sobre un dominio fijo, sin comparar strings
+    lf = lf.select([
+        pl.col('ANNO').cast(pl.Int16), # Año cabe en Int16
+        pl.col('TRIMESTRE').cast(pl.Int8),
+        pl.col('ID_DEPARTAMENTO'), # Lo necesitamos para el mapa
+        pl.col('DEPARTAMENTO').cast(enums['DEPARTAMENTO']),
+        pl.col('MUNICIPIO').cast(enums['MUNICIPIO']),
+        pl.col('EMPRESA').cast(enums['EMPRESA']),
+        pl.col('SEGMENTO').cast(enums['SEGMENTO']),
+        pl.col('SERVICIO_PAQUETE').cast(enums['SERVICIO_PAQUETE']),
+        pl.col('TECNOLOGIA').cast(enums['TECNOLOGIA']),
+        pl.col('VELOCIDAD_EFECTIVA_DOWNSTREAM'),
+        pl.col('VELOCIDAD_EFECTIVA_UPSTREAM'),
+        pl.col('CANTIDAD_LINEAS_ACCESOS'),
+        pl.col('VALOR_FACTURADO_O_COBRADO'), 
+        pl.col('OTROS_VALORES_FACTURADOS')
+    ])
+
+    # Transformaciones
+    lf = lf.with_columns([
+        pl.col("VALOR_FACTURADO_O_COBRADO").fill_null(0),
+        pl.col("OTROS_VALORES_FACTURADOS").fill_null(0),
+        pl.col("CANTIDAD_LINEAS_ACCESOS").fill_null(0),
+        pl.col("VELOCIDAD_EFECTIVA_DOWNSTREAM").fill_null(0),
+        PERIODO.cast(enums['PERIODO']).alias("PERIODO"),
+        # Convertimos a string solo al final y para la columna específica del mapa
+        pl.col("ID_DEPARTAMENTO").cast(pl.String).str.zfill(2).alias("ID_DEPTO_MAPA")
+    ])
+
+    # Calculamos Valor Total
+    return lf.with_columns(
+        (pl.col("VALOR_FACTURADO_O_COBRADO") + pl.col("OTROS_VALORES_FACTURADOS")).alias("VALOR_TOTAL")
+    )
+
+
+def escanear(fuente, predicado=None):
+    """Consulta perezosa (LazyFrame) tipada sobre la fuente, con el predicado en el scan.
+
+    Sobre shards crudos el predicado se aplica antes de los casts, para que Polars lo
+    empuje al lector de parquet. Sobre el almacén las columnas ya están listas y los
+    filtros de ANNO/TRIMESTRE descartan particiones enteras.
+    """
+    if fuente.almacen:
+        lf = pl.scan_parquet(list(fuente.archivos), hive_partitioning=True, hive_schema=ESQUEMA_PARTICION)
+        return lf if predicado is None else lf.filter(predicado)
+
+    lf = pl.scan_parquet(list(fuente.archivos))
+    if predicado is not None:
+        lf = lf.filter(predicado)
+    return transformar(lf, fuente.dominios)
+
+
+def listar_archivos(patron_crudos=PATRON_CRUDOS, directorio_almacen=DIRECTORIO_ALMACEN):
+    """(archivos, almacen): el almacén compactado si ya se generó; si no, los shards crudos."""
+    if os.path.exists(os.path.join(directorio_almacen, ARCHIVO_METADATOS)):
+        archivos = sorted(glob.glob(os.path.join(directorio_almacen, "**", "*.parquet"), recursive=True))
+        if archivos:
+            return archivos, True
+
+    return sorted(glob.glob(patron_crudos)), False
+
+
+def shards_sin_ingerir(patron_crudos=PATRON_CRUDOS, directorio_almacen=DIRECTORIO_ALMACEN):
+    """Shards crudos del patrón que el almacén no incluye: nuevos o con otro tamaño que al ingerirlos."""
+    with open(os.path.join(directorio_almacen, ARCHIVO_METADATOS), encoding="utf-8") as f:
+        origen = {os.path.abspath(o["ruta"]): o["bytes"] for o in json.load(f)["origen"]}
+    return [a for a in sorted(glob.glob(patron_crudos)) if origen.get(os.path.abspath(a)) != os.path.getsize(a)]
+
+
+def crear_fuente(archivos, almacen, motor="auto"):
+    """Fuente con sus dominios: del esquema en el almacén, de una pasada sobre los crudos."""
+    if almacen:
+        esquema = pl.scan_parquet(archivos[0]).collect_schema()
+        return Fuente(tuple(archivos), True, dominios_de_esquema(esquema))
+    return Fuente(tuple(archivos), False, calcular_dominios(pl.scan_parquet(list(archivos)), motor))
+
+
+# ==========================================
+# MANIFIESTO E INGESTA INCREMENTAL
+# ==========================================
+
+def firmar_archivos(archivos):
+    """Manifiesto {ruta: (bytes, mtime_ns)}: identifica qué versión de cada archivo se leyó."""
+    firmas = {}
+    for archivo in archivos:
+        info = os.stat(archivo)
+        firmas[archivo] = (info.st_size, info.st_mtime_ns)
+    return firmas
+
+
+def combinar_dominios(*grupos):
+    """Une los dominios de varias fuentes; las categorías quedan ordenadas."""
+    valores = {c: set() for c in DIMENSIONES_ENUM}
+    for dominios in grupos:
+        for c, categorias in dominios:
+            valores[c].update(categorias)
+    return tuple((c, tuple(sorted(valores[c]))) for c in DIMENSIONES_ENUM)
+
+
+def aplicar_dominios(df, dominios):
+    """Re-tipa las columnas Enum de `df` (DataFrame o LazyFrame) a dominios más amplios conservando los valores."""
+    columnas = df.collect_schema().names()
+    return df.with_columns([
+        pl.col(c).cast(pl.String).cast(pl.Enum(categorias))
+        for c, categorias in dominios if c in columnas
+    ])
+
+
+# ==========================================
+# ESCRITURA DEL ALMACÉN
+# ==========================================
+
+def ingestar(archivos, destino=DIRECTORIO_ALMACEN, filas_por_row_group=FILAS_POR_ROW_GROUP):
+    """Reescribe los shards como almacén particionado y devuelve sus metadatos.
+
+    Se procesa una partición ANNO/TRIMESTRE por vez (la memoria queda acotada al
+    trimestre más grande) en un directorio temporal que reemplaza al anterior al final.
+    """
+    crudos = pl.scan_parquet(archivos)
+    # Un único dominio por dimensión para todo el almacén: todas las particiones
+    # comparten el mismo Enum y se pueden escanear juntas
+    dominios = calcular_dominios(crudos)
+    particiones = (
+        crudos.select(["ANNO", "TRIMESTRE"]).unique().drop_nulls()
+        .sort(["ANNO", "TRIMESTRE"]).collect()
+    )
+
+    temporal = destino.rstrip("/\\") + ".tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+
+    resumen = []
+    for anno, trimestre in particiones.iter_rows():
+        # El filtro va sobre las columnas crudas para que se empuje al lector
+        df = (
+            transformar(crudos.filter((pl.col("ANNO") == anno) & (pl.col("TRIMESTRE") == trimestre)), dominios)
+            .drop(list(ESQUEMA_PARTICION))
+            .sort(ORDEN_ALMACEN)
+            .collect()
+        )
+
+        carpeta = os.path.join(temporal, f"ANNO={anno}", f"TRIMESTRE={trimestre}")
+        os.makedirs(carpeta)
+        df.write_parquet(
+            os.path.join(carpeta, "part-0.parquet"),
+            compression="zstd",
+            statistics=True,
+            row_group_size=filas_por_row_group
+        )
+        resumen.append({"ANNO": anno, "TRIMESTRE": trimestre, "filas": df.height})
+
+    metadatos = {
+        "creado": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "origen": [{"ruta": a, "bytes": os.path.getsize(a)} for a in archivos],
+        "orden": ORDEN_ALMACEN,
+        "filas_por_row_group": filas_por_row_group,
+        "particiones": resumen
+    }
+    with open(os.path.join(temporal, ARCHIVO_METADATOS), "w", encoding="utf-8") as f:
+        json.dump(metadatos, f, indent=2)
+
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporal, destino)
+    return metadatos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta los shards crudos en el almacén Parquet del tablero.")
+    parser.add_argument("--origen", default=PATRON_CRUDOS, help="Patrón glob de los shards crudos")
+    parser.add_argument("--destino", default=DIRECTORIO_ALMACEN, help="Directorio del almacén")
+    parser.add_argument("--filas-por-row-group", type=int, default=FILAS_POR_ROW_GROUP)
+    args = parser.parse_args()
+
+    archivos = sorted(glob.glob(args.origen))
+    if not archivos:
+        raise SystemExit(f"No se encontraron archivos con el patrón: {args.origen}")
+
+    metadatos = ingestar(archivos, args.destino, args.filas_por_row_group)
+    filas = sum(p["filas"] for p in metadatos["particiones"])
+    print(f"{len(archivos)} shards -> {args.destino}: {len(metadatos['particiones'])} particiones, {filas:,} filas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Instantánea en disco de un Dataset ya cargado: cubo en Arrow IPC y metadatos en JSON.
+
+Cargar desde los shards repite en cada proceso nuevo los dominios, las opciones de los
+filtros y el cubo. La instantánea guarda ese resultado junto con el manifiesto de los
+archivos de los que salió; un proceso que arranca con el mismo manifiesto mapea el cubo
+en memoria en lugar de recalcularlo, y todos los procesos del host comparten la copia
+del page cache.
+
+Cada manifiesto tiene su par de archivos (cubo_<hash>.arrow y cubo_<hash>.json), así que
+réplicas sobre los mismos datos encuentran la misma instantánea sin coordinarse. Los
+histogramas y los bocetos que el Dataset ya tenga construidos (p. ej. combinados por
+`Dataset.ampliar`) van al lado, en cubo_<hash>_<tabla>.arrow.
+"""
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+import polars as pl
+import pyarrow as pa
+
+from .bocetos import Bocetos
+from .ingesta import Fuente
+
+DIRECTORIO_INSTANTANEA = "./instantanea_crc"
+FORMATO = 2  # Se incrementa si cambia el contenido del cubo o de los metadatos
+
+
+def abrir_cubo(ruta):
+    """Cubo desde un archivo IPC mapeado en memoria; las columnas numéricas no se copian."""
+    with pa.memory_map(ruta) as archivo:
+        return pl.from_arrow(pa.ipc.open_file(archivo).read_all())
+
+
+def huella(firmas):
+    """Hash del manifiesto {ruta: (bytes, mtime_ns)}, independiente del orden."""
+    texto = json.dumps(sorted((ruta, list(firma)) for ruta, firma in firmas.items()))
+    return hashlib.sha256(texto.encode()).hexdigest()[:16]
+
+
+def rutas(directorio, firmas):
+    base = os.path.join(directorio, f"cubo_{huella(firmas)}")
+    return base + ".arrow", base + ".json"
+
+
+def ruta_derivado(ruta_cubo, nombre):
+    return f"{ruta_cubo[:-len('.arrow')]}_{nombre}.arrow"
+
+
+def tablas_derivadas(histogramas, bocetos):
+    """{nombre: tabla} de los derivados presentes, con los nombres de archivo de la instantánea."""
+    tablas = {} if histogramas is None else {"histogramas": histogramas}
+    if bocetos is not None:
+        tablas.update({f"bocetos_{nombre}": tabla for nombre, tabla in bocetos.tablas_por_nombre().items()})
+    return tablas
+
+
+def guardar_instantanea(dataset, firmas, directorio=DIRECTORIO_INSTANTANEA):
+    """Escribe la instantánea del dataset y borra las de otros manifiestos; devuelve la ruta del cubo."""
+    os.makedirs(directorio, exist_ok=True)
+    ruta_cubo, ruta_metadatos = rutas(directorio, firmas)
+    derivados = tablas_derivadas(*dataset.derivados())
+
+    metadatos = {
+        "formato": FORMATO,
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        "polars": pl.__version__,
+        "manifiesto": sorted([ruta, *firma] for ruta, firma in firmas.items()),
+        "almacen": dataset.fuente.almacen,
+        "dominios": [[c, list(categorias)] for c, categorias in dataset.fuente.dominios],
+        "opciones": dataset.opciones,
+        "celdas_cubo": dataset.cubo.height,
+        "derivados": sorted(derivados)
+    }
+
+    # Temporales por proceso y os.replace: otra réplica nunca ve un archivo a medio escribir.
+    # Las tablas van primero: unos metadatos presentes garantizan que todas están completas
+    sufijo = f".{os.getpid()}.tmp"
+    tablas = {ruta_cubo: dataset.cubo, **{ruta_derivado(ruta_cubo, n): t for n, t in derivados.items()}}
+    for ruta, tabla in tablas.items():
+        tabla.write_ipc(ruta + sufijo, compression="uncompressed")  # Sin comprimir para mapearlo
+        os.replace(ruta + sufijo, ruta)
+    with open(ruta_metadatos + sufijo, "w", encoding="utf-8") as destino:
+        json.dump(metadatos, destino, ensure_ascii=False)
+    os.replace(ruta_metadatos + sufijo, ruta_metadatos)
+
+    for ruta in glob.glob(os.path.join(directorio, "cubo_*")):
+        if ruta not in tablas and ruta != ruta_metadatos and not ruta.endswith(".tmp"):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass  # Mapeado por otro proceso en Windows: se borrará en la próxima escritura
+    return ruta_cubo
+
+
+def abrir_instantanea(firmas, directorio=DIRECTORIO_INSTANTANEA):
+    """(fuente, opciones, cubo, ruta_cubo, histogramas, bocetos) guardados para exactamente este manifiesto, o None.
+
+    Histogramas y bocetos son None si el Dataset aún no los tenía al guardarse.
+    """
+    ruta_cubo, ruta_metadatos = rutas(directorio, firmas)
+    if not os.path.exists(ruta_metadatos):
+        return None
+
+    with open(ruta_metadatos, encoding="utf-8") as origen:
+        metadatos = json.load(origen)
+    manifiesto = {ruta: (tamano, mtime) for ruta, tamano, mtime in metadatos["manifiesto"]}
+    if metadatos["formato"] != FORMATO or manifiesto != firmas:
+        return None
+
+    fuente = Fuente(
+        tuple(sorted(firmas)), metadatos["almacen"],
+        tuple((c, tuple(categorias)) for c, categorias in metadatos["dominios"])
+    )
+    derivados = {nombre: abrir_cubo(ruta_derivado(ruta_cubo, nombre)) for nombre in metadatos["derivados"]}
+    bocetos = None
+    if f"bocetos_{Bocetos.TABLAS[0]}" in derivados:
+        bocetos = Bocetos(**{nombre: derivados[f"bocetos_{nombre}"] for nombre in Bocetos.TABLAS})
+    return fuente, metadatos["opciones"], abrir_cubo(ruta_cubo), ruta_cubo, derivados.get("histogramas"), bocetos
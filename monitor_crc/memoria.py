@@ -0,0 +1,75 @@
+"""Modo streaming para datos mayores que la memoria: motor de Polars y cubo fuera del heap.
+
+Con el motor en memoria, una consulta sobre las filas crudas carga primero las columnas
+que usa de todos los archivos. Si el tamaño estimado de esas filas supera el techo de
+memoria, el Dataset pasa a modo streaming:
+
+    - las consultas sobre las filas (carga, rangos financieros, vistas de velocidad) y
+      las re-agregaciones corren con el motor de streaming de Polars, por bloques;
+    - el cubo y los histogramas se arman un año por vez (ANNO es parte de su grano, así
+      que los trozos no se solapan), se escriben en Arrow IPC y se mapean en memoria:
+      el page cache los pagina en lugar de tenerlos en el heap.
+
+El techo sale de MONITOR_CRC_TECHO_MB o, si no está, de la mitad de la RAM del host.
+"""
+import os
+import shutil
+import tempfile
+
+import polars as pl
+
+from .instantanea import abrir_cubo
+
+MOTOR_MEMORIA = "auto"
+MOTOR_STREAMING = "streaming"
+
+FILAS_MUESTRA = 10_000  # Filas del primer archivo con las que se estima el tamaño por fila
+FRACCION_RAM = 0.5  # Techo por defecto: deja el resto para el cubo, las sesiones y el page cache
+
+
+def techo_por_defecto():
+    """Techo en MB: MONITOR_CRC_TECHO_MB o la mitad de la RAM (None si no se puede saber)."""
+    valor = os.environ.get("MONITOR_CRC_TECHO_MB")
+    if valor:
+        return float(valor)
+    try:
+        ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):  # Windows
+        return None
+    return FRACCION_RAM * ram / (1024 * 1024)
+
+
+def estimar_mb(archivos):
+    """MB que ocuparían en memoria las filas de `archivos`: tamaño por fila de una muestra
+    del primero por el total de filas, que sale de los metadatos del parquet."""
+    muestra = pl.scan_parquet(archivos[0]).head(FILAS_MUESTRA).collect()
+    if muestra.height == 0:
+        return 0.0
+    filas = pl.scan_parquet(list(archivos)).select(pl.len()).collect().item()
+    return muestra.estimated_size("mb") / muestra.height * filas
+
+
+def elegir_motor(estimado_mb, techo_mb):
+    return MOTOR_STREAMING if techo_mb is not None and estimado_mb > techo_mb else MOTOR_MEMORIA
+
+
+def materializar(consulta, anos, motor):
+    """DataFrame de `consulta(predicado)`; en streaming, un año por vez y mapeado desde disco.
+
+    `consulta` recibe un predicado extra sobre las filas (None: todas) y devuelve el
+    LazyFrame a materializar; su resultado debe tener ANNO en las claves.
+    """
+    if motor != MOTOR_STREAMING or not anos:
+        return consulta(None).collect(engine=motor)
+
+    directorio = tempfile.mkdtemp(prefix="monitor_crc_")
+    try:
+        partes = []
+        for i, ano in enumerate(anos):
+            ruta = os.path.join(directorio, f"parte_{i}.arrow")
+            consulta(pl.col("ANNO").eq_missing(ano)).sink_ipc(ruta, engine=MOTOR_STREAMING)
+            partes.append(abrir_cubo(ruta))
+        return pl.concat(partes, rechunk=False)
+    finally:
+        # Los mapeos siguen vigentes sin los archivos; en Windows el borrado falla y quedan en temp
+        shutil.rmtree(directorio, ignore_errors=True)
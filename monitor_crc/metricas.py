@@ -0,0 +1,88 @@
+"""Métricas del tablero: una función por pestaña, (dataset, filtros) -> {nombre: DataFrame}.
+
+Cada función resuelve todas las tablas de su pestaña en una sola ejecución de Polars.
+Las tablas salen con las dimensiones como texto y los nombres de columna que usan los
+gráficos; no dependen de Streamlit, así que sirven igual para scripts y trabajos batch.
+
+Con `aproximado=True`, las tablas de `bocetos.TABLAS_BOCETOS` salen de los bocetos del
+Dataset cuando los filtros lo permiten (ver `bocetos.aplicable`).
+"""
+from . import bocetos, distribuciones
+from .agregados import calcular_agregados, histograma_velocidades, muestra_estratificada
+
+
+def calcular_pestana(dataset, filtros, pestana, aproximado=False):
+    if not (aproximado and bocetos.aplicable(filtros) and pestana in bocetos.TABLAS_BOCETOS):
+        return calcular_agregados(dataset.filtrar(filtros), pestana, motor=dataset.motor)
+
+    aproximadas = dataset.bocetos.tablas(filtros, pestana)
+    tablas = calcular_agregados(dataset.filtrar(filtros), pestana, omitir=aproximadas, motor=dataset.motor)
+    tablas.update(aproximadas)
+    return tablas
+
+
+def general(dataset, filtros, aproximado=False):
+    """kpis, map_data, muni_data, serv_data, seg_data."""
+    return calcular_pestana(dataset, filtros, "general", aproximado)
+
+
+def financiero(dataset, filtros, aproximado=False):
+    """kpis, val_paq, val_op, val_tec."""
+    return calcular_pestana(dataset, filtros, "financiero", aproximado)
+
+
+def tendencias(dataset, filtros, aproximado=False):
+    """df_temp, tec_trend, paq_trend, vel_trend, heat_data."""
+    return calcular_pestana(dataset, filtros, "tendencias", aproximado)
+
+
+def conectividad(dataset, filtros, aproximado=False):
+    """kpis, lin_tec, lin_seg, vel_depto."""
+    return calcular_pestana(dataset, filtros, "conectividad", aproximado)
+
+
+def competencia(dataset, filtros, aproximado=False):
+    """share_val, share_vol, dom_op, div_op."""
+    return calcular_pestana(dataset, filtros, "competencia", aproximado)
+
+
+def segmentacion(dataset, filtros, aproximado=False):
+    """seg_dist, seg_val, seg_tec, seg_vel."""
+    return calcular_pestana(dataset, filtros, "segmentacion", aproximado)
+
+
+def geografico(dataset, filtros, aproximado=False):
+    """map_rev_data, top_munis, low_speed_munis, tabla_resumen."""
+    return calcular_pestana(dataset, filtros, "geografico", aproximado)
+
+
+# En el orden de las pestañas del tablero
+PESTANAS = {
+    "general": general,
+    "financiero": financiero,
+    "tendencias": tendencias,
+    "conectividad": conectividad,
+    "competencia": competencia,
+    "segmentacion": segmentacion,
+    "geografico": geografico
+}
+
+
+def densidad_velocidades(dataset, filtros, bins):
+    """Histograma 2D Down x Up (log10(1 + Mbps)) sobre todas las filas filtradas."""
+    return histograma_velocidades(dataset.filas(filtros), bins).collect(engine=dataset.motor)
+
+
+def muestra_velocidades(dataset, filtros, presupuesto):
+    """Muestra de ~`presupuesto` filas filtradas con cuota por tecnología."""
+    return muestra_estratificada(dataset.filas(filtros), presupuesto).collect(engine=dataset.motor)
+
+
+def distribucion_velocidades(dataset, filtros):
+    """por_periodo y por_tecnologia (P10, P50, P90) y cdf_tecnologia, de bajada y subida."""
+    if distribuciones.aplicable(filtros):
+        histogramas = dataset.histogramas.lazy().filter(filtros.predicado())
+    else:
+        # Filtros fuera de la celda: los mismos bins, sobre las filas crudas filtradas
+        histogramas = distribuciones.construir_histogramas(dataset.filas(filtros), ["PERIODO", "TECNOLOGIA"])
+    return distribuciones.calcular_distribuciones(histogramas, dataset.motor)
@@ -0,0 +1,73 @@
+"""Cronómetro por secciones con nombre y memoria del proceso, para perfilar un rerun."""
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import polars as pl
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Líneas JSON del modo perfil (p. ej. una por agregación). Solo las emiten los hilos
+# marcados con `activar_en_hilo`: el nivel del logger no decide nada
+registro_perfil = logging.getLogger("monitor_crc.perfil")
+_hilo = threading.local()
+
+
+def activar_en_hilo(activo):
+    """Marca si el hilo actual (el rerun de una sesión) está en modo perfil."""
+    _hilo.activo = activo
+
+
+def activo_en_hilo():
+    """True si el hilo actual está en modo perfil; se consulta antes de armar cada línea."""
+    return getattr(_hilo, "activo", False)
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso en MB (None si la plataforma no lo expone)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS, bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+class Perfil:
+    """Tiempos de las secciones de un rerun. Inactivo, `medir` no hace nada."""
+
+    def __init__(self, activo):
+        self.activo = activo
+        self.inicio = time.perf_counter()
+        self.secciones = []  # (sección, ms) en el orden en que terminan
+
+    @contextmanager
+    def medir(self, seccion):
+        if not self.activo:
+            yield
+            return
+
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.secciones.append((seccion, (time.perf_counter() - inicio) * 1000))
+
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def tabla(self):
+        """Una fila por sección (sumando las repetidas) con su peso sobre el rerun completo."""
+        total = self.total_ms()
+        return pl.DataFrame(
+            self.secciones, schema={"SECCION": pl.String, "MS": pl.Float64}, orient="row"
+        ).group_by("SECCION", maintain_order=True).agg(
+            pl.col("MS").sum(),
+            pl.len().alias("LLAMADAS")
+        ).with_columns(
+            (pl.col("MS") / total * 100).alias("PCT_RERUN")
+        )
@@ -0,0 +1,181 @@
+"""Reportes en lote: las tablas de las pestañas del tablero para muchos estados de filtros.
+
+Cada especificación es un estado del sidebar con nombre. Las que solo difieren en una
+selección de un único valor (un departamento, una empresa, un año...) forman un lote:
+el lote filtra una vez con la unión de esos valores y agrega con esa dimensión como
+clave adicional (`PlanAgregaciones.ejecutar_por`), en lugar de filtrar y agregar una
+vez por especificación. Con un `PoolConsultas`, los lotes se reparten entre procesos.
+
+    especificaciones = leer_especificaciones("reportes.json", dataset)
+    tablas = calcular_reportes(dataset, especificaciones)  # {nombre: {pestaña: {tabla: DataFrame}}}
+"""
+import json
+import math
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import polars as pl
+
+from .agregados import AGREGADOS_PESTANAS, PlanAgregaciones
+from .filtros import CAMPOS_SELECCION, Filtros
+
+# Columna de los datos que filtra cada campo de selección del sidebar
+COLUMNAS_SELECCION = {
+    "anos": "ANNO",
+    "departamentos": "DEPARTAMENTO",
+    "municipios": "MUNICIPIO",
+    "empresas": "EMPRESA",
+    "paquetes": "SERVICIO_PAQUETE",
+    "tecnologias": "TECNOLOGIA"
+}
+
+Especificacion = namedtuple("Especificacion", ["nombre", "filtros"])
+
+# Especificaciones que se calculan juntas: `campo` es la dimensión que varía (None si
+# el lote es una sola especificación) y `filtros` el estado común con la unión de valores
+Lote = namedtuple("Lote", ["campo", "filtros", "especificaciones"])
+
+
+def tablas_de(pestana):
+    """Nombres de las tablas de una pestaña, en el orden en que las declara."""
+    plan = PlanAgregaciones(None)
+    AGREGADOS_PESTANAS[pestana](plan)
+    return list(plan.consultas)
+
+
+def leer_especificaciones(ruta, dataset):
+    """Especificaciones de un JSON con una lista de estados del sidebar.
+
+    Cada entrada tiene `nombre`, los campos de `Filtros` (listas; los rangos como
+    [mínimo, máximo]) y opcionalmente `por`: un campo de selección que se expande en
+    una especificación por valor, limitada a los `top` de más registros si se indica.
+
+        {"nombre": "depto", "anos": [2024], "por": "departamentos"}
+        {"nombre": "operador", "por": "empresas", "top": 10}
+    """
+    with open(ruta, encoding="utf-8") as origen:
+        entradas = json.load(origen)
+
+    especificaciones = []
+    for entrada in entradas:
+        entrada = dict(entrada)
+        nombre = entrada.pop("nombre")
+        por = entrada.pop("por", None)
+        top = entrada.pop("top", None)
+        # Mismo estado canónico que Filtros.desde_sidebar: selecciones ordenadas
+        filtros = Filtros(**{
+            campo: tuple(sorted(valor)) if campo in CAMPOS_SELECCION else (tuple(map(float, valor)) if valor else None)
+            for campo, valor in entrada.items()
+        })
+        if por is None:
+            especificaciones.append(Especificacion(nombre, filtros))
+            continue
+        if por not in CAMPOS_SELECCION:
+            raise ValueError(f"'por' debe ser uno de {CAMPOS_SELECCION}: {por}")
+        especificaciones += [
+            Especificacion(f"{nombre}_{valor}", replace(filtros, **{por: (valor,)}))
+            for valor in valores_de(dataset, filtros, por, top)
+        ]
+
+    repetidos = [nombre for nombre, n in Counter(e.nombre for e in especificaciones).items() if n > 1]
+    if repetidos:
+        raise ValueError(f"Nombres de reporte repetidos: {repetidos}")
+    return especificaciones
+
+
+def valores_de(dataset, filtros, campo, top=None):
+    """Valores de `campo` con registros bajo `filtros`: todos ordenados, o los `top` más pesados."""
+    columna = COLUMNAS_SELECCION[campo]
+    por_valor = dataset.filtrar(filtros).group_by(columna).agg(pl.col("REGISTROS").sum())
+    if top:
+        por_valor = por_valor.sort("REGISTROS", descending=True).head(top)
+    else:
+        por_valor = por_valor.sort(columna)
+    return por_valor.collect()[columna].cast(pl.String if columna != "ANNO" else pl.Int64).to_list()
+
+
+def agrupar(especificaciones):
+    """Lotes de especificaciones que solo difieren en el valor único de un mismo campo.
+
+    Cada especificación va al lote más grande al que puede pertenecer; las que no
+    comparten nada con otras forman lotes de una.
+    """
+    def candidatos(filtros):
+        return [
+            (campo, replace(filtros, **{campo: ()}))
+            for campo in CAMPOS_SELECCION if len(getattr(filtros, campo)) == 1
+        ]
+
+    tamanos = Counter(c for e in especificaciones for c in set(candidatos(e.filtros)))
+    grupos = {}
+    for especificacion in especificaciones:
+        opciones = [c for c in candidatos(especificacion.filtros) if tamanos[c] > 1]
+        llave = max(opciones, key=lambda c: tamanos[c], default=(None, especificacion.filtros))
+        grupos.setdefault(llave, []).append(especificacion)
+
+    lotes = []
+    for (campo, resto), miembros in grupos.items():
+        if campo is None:
+            lotes += [Lote(None, e.filtros, [e]) for e in miembros]
+            continue
+        valores = sorted({getattr(e.filtros, campo)[0] for e in miembros})
+        lotes.append(Lote(campo, replace(resto, **{campo: tuple(valores)}), miembros))
+    return lotes
+
+
+def dividir(lote, partes):
+    """El lote en hasta `partes` lotes con valores disjuntos, para repartirlo entre procesos."""
+    if lote.campo is None or partes <= 1:
+        return [lote]
+    valores = getattr(lote.filtros, lote.campo)
+    tamano = math.ceil(len(valores) / partes)
+    trozos = []
+    for i in range(0, len(valores), tamano):
+        propios = set(valores[i:i + tamano])
+        trozos.append(Lote(
+            lote.campo, replace(lote.filtros, **{lote.campo: tuple(sorted(propios))}),
+            [e for e in lote.especificaciones if getattr(e.filtros, lote.campo)[0] in propios]
+        ))
+    return trozos
+
+
+def calcular_lote(dataset, filtros, campo, valores, pestanas):
+    """{valor: {tabla: DataFrame}} de las pestañas pedidas (`valor` None sin campo variable).
+
+    Es de nivel de módulo y tiene la firma de las funciones de `metricas`, así que
+    también corre en un `PoolConsultas`.
+    """
+    plan = PlanAgregaciones(dataset.filtrar(filtros), dataset.motor)
+    for pestana in pestanas:
+        AGREGADOS_PESTANAS[pestana](plan)
+    if campo is None:
+        return {None: plan.ejecutar()}
+    return plan.ejecutar_por(COLUMNAS_SELECCION[campo], valores)
+
+
+def calcular_reportes(dataset, especificaciones, pestanas=tuple(AGREGADOS_PESTANAS), pool=None):
+    """{nombre: {pestaña: {tabla: DataFrame}}} de cada especificación, en el orden recibido."""
+    partes = pool.procesos if pool is not None else 1
+    trabajos = [trozo for lote in agrupar(especificaciones) for trozo in dividir(lote, partes)]
+
+    def resolver(lote):
+        args = (lote.filtros, lote.campo, getattr(lote.filtros, lote.campo) if lote.campo else None, pestanas)
+        if pool is None:
+            return calcular_lote(dataset, *args)
+        return pool.ejecutar(calcular_lote, dataset, *args)
+
+    # Con pool, un hilo por proceso mantiene a todos ocupados
+    with ThreadPoolExecutor(partes) as hilos:
+        resultados = list(hilos.map(resolver, trabajos))
+
+    nombres = {pestana: tablas_de(pestana) for pestana in pestanas}
+    por_nombre = {}
+    for lote, tablas in zip(trabajos, resultados):
+        for especificacion in lote.especificaciones:
+            valor = getattr(especificacion.filtros, lote.campo)[0] if lote.campo else None
+            por_nombre[especificacion.nombre] = {
+                pestana: {nombre: tablas[valor][nombre] for nombre in nombres[pestana]}
+                for pestana in pestanas
+            }
+    return {e.nombre: por_nombre[e.nombre] for e in especificaciones}
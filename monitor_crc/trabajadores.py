@@ -0,0 +1,132 @@
+"""Pool de procesos que responde consultas de métricas sobre un cubo compartido por mmap.
+
+Cada sesión de Streamlit es un hilo del mismo intérprete: con muchas sesiones a la vez,
+la parte de Python de cada consulta se forma en fila detrás del GIL. Con el pool, la
+sesión envía (función de métricas, filtros) y recibe las tablas pequeñas del resultado;
+el trabajo corre en otro proceso.
+
+El cubo de cada versión se publica una vez como archivo Arrow IPC sin comprimir y cada
+proceso lo abre con `pyarrow.memory_map`: todos leen las mismas páginas del page cache
+en lugar de tener una copia cada uno. Los histogramas de velocidad y los bocetos del
+modo aproximado se construyen una vez en el proceso principal y se publican igual, así
+que ningún proceso vuelve a recorrer las filas crudas para armarlos. Las consultas con
+rangos financieros escanean la fuente (parquet) desde el propio proceso.
+
+    pool = PoolConsultas(procesos=4)
+    tablas = pool.ejecutar(metricas.general, dataset, filtros)
+"""
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .bocetos import Bocetos
+from .dataset import Dataset
+from .instantanea import abrir_cubo
+
+# Lo que necesita un proceso para reconstruir el Dataset de una versión (se envía con
+# cada tarea; es pequeño porque las tablas viajan como rutas y las opciones no hacen
+# falta: los histogramas, lo único que las usa, llegan ya construidos)
+Publicacion = namedtuple(
+    "Publicacion", ["version", "ruta_cubo", "fuente", "motor", "ruta_histogramas", "rutas_bocetos"]
+)
+
+# Dataset de la última versión vista por este proceso del pool
+_vigente = None
+
+
+def _dataset_de(publicacion):
+    global _vigente
+    if _vigente is None or _vigente.version != publicacion.version:
+        bocetos = Bocetos(**{nombre: abrir_cubo(ruta) for nombre, ruta in publicacion.rutas_bocetos.items()})
+        _vigente = Dataset(
+            publicacion.fuente, {}, abrir_cubo(publicacion.ruta_cubo), publicacion.version, motor=publicacion.motor,
+            histogramas=abrir_cubo(publicacion.ruta_histogramas), bocetos=bocetos
+        )
+    return _vigente
+
+
+def _rutas(publicacion):
+    return [publicacion.ruta_cubo, publicacion.ruta_histogramas, *publicacion.rutas_bocetos.values()]
+
+
+def _ejecutar(publicacion, funcion, filtros, args):
+    return funcion(_dataset_de(publicacion), filtros, *args)
+
+
+class PoolConsultas:
+    """Procesos que calculan las funciones de `metricas` sobre la versión publicada del Dataset.
+
+    `ejecutar` es seguro entre hilos: cada sesión bloquea solo hasta tener su resultado,
+    y con N procesos hasta N consultas avanzan a la vez.
+    """
+
+    def __init__(self, procesos=None, directorio=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.directorio = directorio or tempfile.mkdtemp(prefix="monitor_crc_")
+        self.publicacion = None
+        self.lock = threading.Lock()
+
+        # Sin esto cada proceso abriría tantos hilos de Polars como núcleos haya
+        os.environ.setdefault("POLARS_MAX_THREADS", str(max(1, (os.cpu_count() or 1) // self.procesos)))
+        # spawn: el servidor tiene hilos vivos y fork solo copiaría el que llama
+        self.ejecutor = ProcessPoolExecutor(self.procesos, mp_context=get_context("spawn"))
+
+    def escribir(self, tabla, nombre, version):
+        ruta = os.path.join(self.directorio, f"{nombre}_v{version}.arrow")
+        temporal = ruta + ".tmp"
+        # Sin comprimir para que se pueda mapear tal cual
+        tabla.write_ipc(temporal, compression="uncompressed")
+        os.replace(temporal, ruta)
+        return ruta
+
+    def publicar(self, dataset):
+        """Publica el cubo y sus derivados si la versión aún no lo está; borra lo que el pool publicó antes.
+
+        Los histogramas y los bocetos se construyen aquí, una sola vez por versión. Si el
+        cubo ya está mapeado desde una instantánea, los procesos abren ese mismo archivo.
+        """
+        publicacion = self.publicacion
+        if publicacion is not None and publicacion.version == dataset.version:
+            return publicacion
+
+        with self.lock:
+            if self.publicacion is not None and self.publicacion.version == dataset.version:
+                return self.publicacion
+
+            version = dataset.version
+            ruta = dataset.ruta_cubo or self.escribir(dataset.cubo, "cubo", version)
+            histogramas = self.escribir(dataset.histogramas, "histogramas", version)
+            bocetos = {
+                nombre: self.escribir(tabla, f"bocetos_{nombre}", version)
+                for nombre, tabla in dataset.bocetos.tablas_por_nombre().items()
+            }
+
+            anterior = self.publicacion
+            self.publicacion = Publicacion(version, ruta, dataset.fuente, dataset.motor, histogramas, bocetos)
+            if anterior is not None:
+                for ruta_anterior in _rutas(anterior):
+                    if os.path.dirname(ruta_anterior) != self.directorio:
+                        continue  # El cubo de una instantánea no es del pool
+                    # En Linux los procesos que aún lo tienen mapeado siguen leyéndolo sin problema
+                    try:
+                        os.remove(ruta_anterior)
+                    except OSError:
+                        pass
+            return self.publicacion
+
+    def ejecutar(self, funcion, dataset, filtros, *args):
+        """`funcion(dataset, filtros, *args)` en un proceso del pool.
+
+        `funcion` debe ser de nivel de módulo (p. ej. `metricas.general`) para poder
+        enviarse al proceso.
+        """
+        publicacion = self.publicar(dataset)
+        return self.ejecutor.submit(_ejecutar, publicacion, funcion, filtros, args).result()
+
+    def cerrar(self):
+        self.ejecutor.shutdown(cancel_futures=True)
+        shutil.rmtree(self.directorio, ignore_errors=True)
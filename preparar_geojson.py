@@ -0,0 +1,170 @@
+"""Prepara el GeoJSON de departamentos que usan los mapas del tablero.
+
+Descarga (o lee de disco) el GeoJSON original una sola vez, lo guarda en `assets/`
+y genera versiones simplificadas (Douglas-Peucker) con coordenadas cuantizadas para
+cada tolerancia pedida. La app lee estos archivos locales; solo si faltan descarga el
+original y lo simplifica en memoria.
+
+Uso:
+    python preparar_geojson.py
+    python preparar_geojson.py --origen ./Colombia.geo.json --tolerancias 0.001 0.005 0.01
+"""
+import argparse
+import json
+import os
+from urllib.request import urlopen
+
+URL_GEOJSON = 'https://gist.githubusercontent.com/john-guerra/43c7656821069d00dcbc/raw/be6a6e239cd5b5b803c6e7c2ec405b793a9064dd/Colombia.geo.json'
+DIRECTORIO_ASSETS = "./assets"
+NOMBRE_BASE = "colombia_departamentos"
+
+# Propiedades que usa el tablero; el resto solo engorda el payload que viaja al navegador
+PROPIEDADES = ("DPTO", "NOMBRE_DPT")
+
+TIEMPO_ESPERA_DESCARGA = 30  # Segundos; un host lento no debe colgar la preparación
+
+
+def ruta_geojson(directorio, tolerancia=None):
+    """Ruta del asset original (sin tolerancia) o de su versión simplificada."""
+    sufijo = "" if tolerancia is None else f"_{tolerancia}"
+    return os.path.join(directorio, f"{NOMBRE_BASE}{sufijo}.geo.json")
+
+
+def leer_origen(origen, tiempo_espera=TIEMPO_ESPERA_DESCARGA):
+    if origen.startswith(("http://", "https://")):
+        with urlopen(origen, timeout=tiempo_espera) as response:
+            return json.load(response)
+    with open(origen, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ==========================================
+# SIMPLIFICACIÓN Y CUANTIZACIÓN
+# ==========================================
+
+def distancia_segmento(p, a, b):
+    """Distancia (en grados) del punto p al segmento a-b."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return ((p[0] - a[0]) ** 2 + (p[1] - a[1]) ** 2) ** 0.5
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    px, py = a[0] + t * dx, a[1] + t * dy
+    return ((p[0] - px) ** 2 + (p[1] - py) ** 2) ** 0.5
+
+
+def douglas_peucker(puntos, tolerancia):
+    """Douglas-Peucker iterativo (sin recursión, los anillos pueden tener miles de vértices)."""
+    if len(puntos) < 3:
+        return puntos
+
+    conservar = [False] * len(puntos)
+    conservar[0] = conservar[-1] = True
+    pila = [(0, len(puntos) - 1)]
+
+    while pila:
+        inicio, fin = pila.pop()
+        max_dist, indice = 0.0, None
+        for i in range(inicio + 1, fin):
+            d = distancia_segmento(puntos[i], puntos[inicio], puntos[fin])
+            if d > max_dist:
+                max_dist, indice = d, i
+        if indice is not None and max_dist > tolerancia:
+            conservar[indice] = True
+            pila.append((inicio, indice))
+            pila.append((indice, fin))
+
+    return [p for p, c in zip(puntos, conservar) if c]
+
+
+def simplificar_anillo(anillo, tolerancia, decimales):
+    """Simplifica un anillo cerrado; devuelve None si colapsa por debajo de un triángulo."""
+    # El anillo cerrado empieza y termina en el mismo punto: se parte en dos mitades
+    # para que Douglas-Peucker no lo reduzca a un único segmento
+    mitad = len(anillo) // 2
+    puntos = douglas_peucker(anillo[:mitad + 1], tolerancia)[:-1] + douglas_peucker(anillo[mitad:], tolerancia)
+
+    cuantizados = []
+    for x, y in (p[:2] for p in puntos):
+        punto = [round(x, decimales), round(y, decimales)]
+        if not cuantizados or cuantizados[-1] != punto:
+            cuantizados.append(punto)
+
+    if cuantizados[0] != cuantizados[-1]:
+        cuantizados.append(cuantizados[0])
+    return cuantizados if len(cuantizados) >= 4 else None
+
+
+def simplificar_geometria(geometria, tolerancia, decimales):
+    if geometria["type"] == "Polygon":
+        poligonos = [geometria["coordinates"]]
+    elif geometria["type"] == "MultiPolygon":
+        poligonos = geometria["coordinates"]
+    else:
+        return geometria
+
+    resultado = []
+    for poligono in poligonos:
+        exterior = simplificar_anillo(poligono[0], tolerancia, decimales)
+        if exterior is None:
+            continue  # Islas más pequeñas que la tolerancia
+        huecos = [h for h in (simplificar_anillo(a, tolerancia, decimales) for a in poligono[1:]) if h]
+        resultado.append([exterior] + huecos)
+
+    if not resultado:
+        # Nunca se elimina un departamento completo: se conserva su polígono mayor cuantizado
+        mayor = max(poligonos, key=lambda p: len(p[0]))
+        resultado = [[simplificar_anillo(mayor[0], 0.0, decimales) or mayor[0]]]
+
+    if len(resultado) == 1:
+        return {"type": "Polygon", "coordinates": resultado[0]}
+    return {"type": "MultiPolygon", "coordinates": resultado}
+
+
+def simplificar_geojson(geojson, tolerancia, decimales):
+    features = []
+    for feature in geojson["features"]:
+        propiedades = feature.get("properties") or {}
+        features.append({
+            "type": "Feature",
+            "properties": {k: propiedades[k] for k in PROPIEDADES if k in propiedades},
+            "geometry": simplificar_geometria(feature["geometry"], tolerancia, decimales)
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def escribir(geojson, ruta):
+    # Separadores compactos: el archivo se envía tal cual dentro de cada figura
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(geojson, f, separators=(",", ":"), ensure_ascii=False)
+    return os.path.getsize(ruta)
+
+
+# ==========================================
+# CLI
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera los GeoJSON locales y simplificados de los mapas.")
+    parser.add_argument("--origen", default=URL_GEOJSON, help="URL o ruta del GeoJSON original")
+    parser.add_argument("--destino", default=DIRECTORIO_ASSETS, help="Directorio de salida")
+    parser.add_argument("--tolerancias", nargs="+", default=["0.001", "0.005", "0.01"],
+                        help="Tolerancias de simplificación en grados (una salida por valor)")
+    parser.add_argument("--decimales", type=int, default=4,
+                        help="Decimales de las coordenadas cuantizadas (4 ~ 11 m)")
+    args = parser.parse_args()
+
+    os.makedirs(args.destino, exist_ok=True)
+    original = leer_origen(args.origen)
+
+    tamano = escribir(original, ruta_geojson(args.destino))
+    print(f"Original: {ruta_geojson(args.destino)} ({tamano / 1024:,.0f} KB)")
+
+    for tolerancia in args.tolerancias:
+        simplificado = simplificar_geojson(original, float(tolerancia), args.decimales)
+        ruta = ruta_geojson(args.destino, tolerancia)
+        tamano = escribir(simplificado, ruta)
+        print(f"Tolerancia {tolerancia}: {ruta} ({tamano / 1024:,.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()